@@ -1,3 +1,8 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, pandas as pd, xarray as xr
+from numpy import datetime64 as dt64, timedelta64 as td64
+
 # This code concerns translating large volume datasets into smaller time-range datasets.
 #
 #   These data files for Oregon Slope Base were pulled from the OOI "data explorer" and stored 
@@ -5,94 +10,102 @@
 #   As each dataset is opened it also has its difficult parameter changed to one more manageable.
 #
 
-if False: 
-    data_source = '../data/data_explorer_1Min/'
-
-    dsA = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_chlora_1Min.nc')
-    dsB = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_backscatter_1Min.nc')
-    dsC = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_cdom_1Min.nc')
-    dsO = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_doxygen_1Min.nc')
-    dsS = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_salinity_1Min.nc')
-    dsT = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_temperature_1Min.nc')
-
-    dsA = dsA.rename_vars({"mass_concentration_of_chlorophyll_a_in_sea_water_profiler_depth_enabled":"chlora"})
-    dsB = dsB.rename_vars({"flubsct_profiler_depth_enabled":"backscatter"})
-    dsC = dsC.rename_vars({"cdomflo_profiler_depth_enabled":"cdom"})
-    dsO = dsO.rename_vars({"moles_of_oxygen_per_unit_mass_in_sea_water_profiler_depth_enabled":"doxygen"})
-    dsS = dsS.rename_vars({"sea_water_practical_salinity_profiler_depth_enabled":"salinity"})
-    dsT = dsT.rename_vars({"sea_water_temperature_profiler_depth_enabled":"temp"})
-
-    # pCO2: no data
-    dsG = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_pco2_1Min.nc')
-    dsG = dsG.rename_vars({"partial_pressure_of_carbon_dioxide_in_sea_water_profiler_depth_enabled":"pco2"})
-
-    dsH = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_ph_1Min.nc')
-    dsI = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_spkir_1Min.nc')
-    dsN = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_nitrate_1Min.nc')
-    dsP = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_par_1Min.nc')
-    dsU = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_veleast_1Min.nc')
-    dsV = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_velnorth_1Min.nc')
-    dsW = xr.open_dataset(data_source + 'osb/profiler/osb_profiler_velup_1Min.nc')
-
-    dsH = dsH.rename_vars({"sea_water_ph_reported_on_total_scale_profiler_depth_enabled":"ph"})
-    dsI = dsI.rename_vars({"spectir_412nm":"si412",  \
-                           "spectir_443nm":"si443", \
-                           "spectir_490nm":"si490", \
-                           "spectir_510nm":"si510", \
-                           "spectir_555nm":"si555", \
-                           "spectir_620nm":"si620", \
-                           "spectir_683nm":"si683"})
-    dsN = dsN.rename_vars({"mole_concentration_of_nitrate_in_sea_water_profiler_depth_enabled":"nitrate"})
-    dsP = dsP.rename_vars({"downwelling_photosynthetic_photon_flux_in_sea_water_profiler_depth_enabled":"par"})
-    dsU = dsU.rename_vars({"eastward_sea_water_velocity_profiler_depth_enabled":"veast"})
-    dsV = dsV.rename_vars({"northward_sea_water_velocity_profiler_depth_enabled":"vnorth"})
-    dsW = dsW.rename_vars({"upward_sea_water_velocity_profiler_depth_enabled":"vup"})
-
-# Subset 1min data from above to smaller time intervals ranges. Results fit within this repo.
-#   month-blocks: All dates use first of the month
+# Subset the 1min source files to smaller time intervals ranges. Results fit within this repo.
+#   Each source file is read once, in time order, and cut at every window edge; a month file
+#   is written as soon as its rows have been read. Sources are split in parallel, one worker
+#   process per source. Windows are half-open [edge k, edge k+1).
 #   short variable names to fit everything in one line per sensor type
 
-def WriteMonthLongDataBlocks(s, y, z, m, n, u, v, wd):
-    dsT.sel(time=slice(u, v)).to_netcdf(wd + 'ctd/'     + s + '_temp_'        + p + y + '_1min.nc')
-    dsS.sel(time=slice(u, v)).to_netcdf(wd + 'ctd/'     + s + '_salinity_'    + p + y + '_1min.nc')
-    dsO.sel(time=slice(u, v)).to_netcdf(wd + 'ctd/'     + s + '_doxygen_'     + p + y + '_1min.nc')
-    dsA.sel(time=slice(u, v)).to_netcdf(wd + 'fluor/'   + s + '_chlora_'      + p + y + '_1min.nc')
-    dsB.sel(time=slice(u, v)).to_netcdf(wd + 'fluor/'   + s + '_backscatter_' + p + y + '_1min.nc')
-    dsC.sel(time=slice(u, v)).to_netcdf(wd + 'fluor/'   + s + '_cdom_'        + p + y + '_1min.nc')
-
-    dsH.sel(time=slice(u, v)).to_netcdf(wd + 'pH/'      + s + '_ph_'          + p + y + '_1min.nc')
-    dsI.sel(time=slice(u, v)).to_netcdf(wd + 'irrad/'   + s + '_spectir_'     + p + y + '_1min.nc')
-    dsN.sel(time=slice(u, v)).to_netcdf(wd + 'nitrate/' + s + '_nitrate_'     + p + y + '_1min.nc')
-    dsP.sel(time=slice(u, v)).to_netcdf(wd + 'par/'     + s + '_par_'         + p + y + '_1min.nc')
-    dsU.sel(time=slice(u, v)).to_netcdf(wd + 'current/' + s + '_veast_'       + p + y + '_1min.nc')
-    dsV.sel(time=slice(u, v)).to_netcdf(wd + 'current/' + s + '_vnorth_'      + p + y + '_1min.nc')
-    dsW.sel(time=slice(u, v)).to_netcdf(wd + 'current/' + s + '_vup_'         + p + y + '_1min.nc')
+# key: (source file under data_source, variable renames, output folder, output sensor name)
+split_sources = {
+    'T': ('{site}/profiler/{site}_profiler_temperature_1Min.nc', {"sea_water_temperature_profiler_depth_enabled":"temp"},                                'ctd',     'temp'),
+    'S': ('{site}/profiler/{site}_profiler_salinity_1Min.nc',    {"sea_water_practical_salinity_profiler_depth_enabled":"salinity"},                      'ctd',     'salinity'),
+    'O': ('{site}/profiler/{site}_profiler_doxygen_1Min.nc',     {"moles_of_oxygen_per_unit_mass_in_sea_water_profiler_depth_enabled":"doxygen"},         'ctd',     'doxygen'),
+    'A': ('{site}/profiler/{site}_profiler_chlora_1Min.nc',      {"mass_concentration_of_chlorophyll_a_in_sea_water_profiler_depth_enabled":"chlora"},     'fluor',   'chlora'),
+    'B': ('{site}/profiler/{site}_profiler_backscatter_1Min.nc', {"flubsct_profiler_depth_enabled":"backscatter"},                                        'fluor',   'backscatter'),
+    'C': ('{site}/profiler/{site}_profiler_cdom_1Min.nc',        {"cdomflo_profiler_depth_enabled":"cdom"},                                               'fluor',   'cdom'),
+    'H': ('{site}/profiler/{site}_profiler_ph_1Min.nc',          {"sea_water_ph_reported_on_total_scale_profiler_depth_enabled":"ph"},                    'pH',      'ph'),
+    'I': ('{site}/profiler/{site}_profiler_spkir_1Min.nc',       {"spectir_" + w + "nm":"si" + w for w in ['412', '443', '490', '510', '555', '620', '683']}, 'irrad',   'spectir'),
+    'N': ('{site}/profiler/{site}_profiler_nitrate_1Min.nc',     {"mole_concentration_of_nitrate_in_sea_water_profiler_depth_enabled":"nitrate"},         'nitrate', 'nitrate'),
+    'P': ('{site}/profiler/{site}_profiler_par_1Min.nc',         {"downwelling_photosynthetic_photon_flux_in_sea_water_profiler_depth_enabled":"par"},    'par',     'par'),
+    'U': ('{site}/profiler/{site}_profiler_veleast_1Min.nc',     {"eastward_sea_water_velocity_profiler_depth_enabled":"veast"},                          'current', 'veast'),
+    'V': ('{site}/profiler/{site}_profiler_velnorth_1Min.nc',    {"northward_sea_water_velocity_profiler_depth_enabled":"vnorth"},                        'current', 'vnorth'),
+    'W': ('{site}/profiler/{site}_profiler_velup_1Min.nc',       {"upward_sea_water_velocity_profiler_depth_enabled":"vup"},                              'current', 'vup')}
+
+month_names     = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 
+                   'august', 'september', 'october', 'november', 'december']
+split_pattern   = '{folder}/{site}_{name}_{month}{year}_1min.nc'
+
+
+def MonthEdges(t0, t1):
+    '''Window edges at the first of each month from the month of t0 to the month of t1, e.g. MonthEdges('2021-01', '2022-01')'''
+    return np.arange(dt64(t0, 'M'), dt64(t1, 'M') + td64(1, 'M')).astype('datetime64[ns]')
+
+def WeekEdges(t0, t1):
+    '''Window edges every 7 days from the day of t0 up to and including t1'''
+    return np.arange(dt64(t0, 'D'), dt64(t1, 'D') + td64(1, 'D'), td64(7, 'D')).astype('datetime64[ns]')
+
+
+def SplitFnms(site, key, edges, wd, pattern=split_pattern):
+    '''
+    Output file names for the windows of edges for one source of split_sources. pattern fields:
+    folder, name (from split_sources), site, key, start and end (pd.Timestamp; e.g. {start:%Y%m%d}),
+    month (lower case name of the start month) and year (of the start).
+    '''
+    folder, name = split_sources[key][2:]
+    fnms = []
+    for u, v in zip(edges[:-1], edges[1:]):
+        start, end = pd.Timestamp(u), pd.Timestamp(v)
+        fnms.append(wd + pattern.format(folder=folder, name=name, site=site, key=key, start=start, end=end,
+                                        month=month_names[start.month - 1], year=str(start.year)))
+    return fnms
+
+
+def SplitSource(fnm, renames, edges, outfnms):
+    '''
+    Write the rows of source file fnm in each window [edges[k], edges[k+1]) to outfnms[k]; one 
+    searchsorted of the time axis finds all cuts and the file is then read window by window, in
+    order, once. Empty windows are not written. Returns the row count of each window.
+    '''
+    rows = []
+    with xr.open_dataset(fnm) as ds:
+        ds = ds.rename_vars(renames)
+        t  = ds['time'].values
+        if (np.diff(t) < td64(0, 'ns')).any(): ds, t = ds.sortby('time'), np.sort(t)
+        cuts = np.searchsorted(t, np.asarray(edges, dtype='datetime64[ns]'), side='left')
+        for i0, i1, outfnm in zip(cuts[:-1], cuts[1:], outfnms):
+            rows.append(int(i1 - i0))
+            if i1 == i0: continue
+            os.makedirs(os.path.dirname(outfnm), exist_ok=True)
+            ds.isel(time=slice(i0, i1)).to_netcdf(outfnm)
+    return rows
+
+
+def SplitSources(s, edges, wd, data_source='../data/data_explorer_1Min/', keys=None, pattern=split_pattern, processes=None):
+    '''
+    Split the 1Min sources of site s (keys of split_sources, default all) into the windows of
+    edges (MonthEdges(), WeekEdges() or any sorted datetime64 array), writing under wd named by
+    pattern (see SplitFnms()). Sources are split in parallel in a pool of worker processes
+    (default: one per core). Returns a DataFrame: one row per output window with its rows.
+    '''
+    keys = list(split_sources) if keys is None else keys
+    jobs = {k: (data_source + split_sources[k][0].format(site=s), split_sources[k][1], edges, 
+                SplitFnms(s, k, edges, wd, pattern)) for k in keys}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {k: pool.submit(SplitSource, *job) for k, job in jobs.items()}
+        results = [(k, fnm, n) for k, future in futures.items() for fnm, n in zip(jobs[k][3], future.result())]
+    return pd.DataFrame(results, columns=['key', 'output', 'rows'])
 
-    return
 
 # This March 2021 OSB dataset is used by the subsequent visual 'tour' of sensor types
-# s = 'osb'
-# y, z = '2021', '2021'
-# m, n = '03', '04'
-# p = 'march'
-# u = dt64(y + '-' + m + '-01')
-# v = dt64(z + '-' + n + '-01')
 # wd = os.getcwd() + '/RepositoryData/rca/'
-
-# WriteMonthLongDataBlocks(s, y, z, m, n, u, v, wd)
+# SplitSources('osb', MonthEdges('2021-03', '2021-04'), wd)
 
 # This 2018 osb segment is for comparison to discrete summary data
-# s = 'osb'
-# y, z = '2018', '2018'
-# m, n = '06', '08'
-# p = 'june_july'
-# u = dt64(y + '-' + m + '-01')
-# v = dt64(z + '-' + n + '-01')
-# wd = os.getcwd() + '/RepositoryData/rca/'
-
-# WriteMonthLongDataBlocks(s, y, z, m, n, u, v, wd)
-
+# SplitSources('osb', MonthEdges('2018-06', '2018-08')[[0, -1]], wd, pattern='{folder}/{site}_{name}_june_july{year}_1min.nc')
 
+# A year of month files for every source, each source read once
+# SplitSources('osb', MonthEdges('2021-01', '2022-01'), wd)
 
 
 # GLODAP Data Loader
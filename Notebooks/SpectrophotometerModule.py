@@ -5,20 +5,30 @@
 ##################
 
 import os, sys, time, glob, warnings
-from IPython.display import clear_output
+from functools import lru_cache
 warnings.filterwarnings('ignore')
-this_dir = os.getcwd()  
+this_dir = os.getcwd()
 
-from matplotlib import pyplot as plt
-from matplotlib import colors as mplcolors
-from matplotlib import animation, rc
-from matplotlib import dates as mdates
 import numpy as np, pandas as pd, xarray as xr
 from numpy import datetime64 as dt64, timedelta64 as td64
 
-from ipywidgets import *
-from traitlets import dlink
-from IPython.display import HTML, Video
+# plotting and widget modules are imported when first used; see deferred.py
+from deferred import Deferred
+plt          = Deferred('matplotlib.pyplot')
+mplcolors    = Deferred('matplotlib.colors')
+animation    = Deferred('matplotlib.animation')
+rc           = Deferred('matplotlib', 'rc')
+mdates       = Deferred('matplotlib.dates')
+widgets      = Deferred('ipywidgets')
+interact     = Deferred('ipywidgets', 'interact')
+interactive  = Deferred('ipywidgets', 'interactive')
+fixed        = Deferred('ipywidgets', 'fixed')
+dlink        = Deferred('traitlets', 'dlink')
+clear_output = Deferred('IPython.display', 'clear_output')
+HTML         = Deferred('IPython.display', 'HTML')
+Video        = Deferred('IPython.display', 'Video')
+
+from profilecatalog import ReadProfileMetadataCached
 
 ##################
 #
@@ -241,17 +251,10 @@ def ReadProfileMetadata(fnm):
     are converted to Timestamps. They correspond to ascend start/end, 
     descend start/end and rest start/end. Timestamps are a bit easier to
     use than datetime64 values, being essentially wrappers around the latter with
-    additional utility.
+    additional utility. The parsed times are kept in a binary sidecar file next 
+    to the CSV (see profilecatalog.py) so only the first read pays for parsing.
     """
-    pDf = pd.read_csv(fnm, usecols=["1", "3", "5", "7", "9", "11"])
-    pDf.columns=['ascent_start', 'ascent_end', 'descent_start', 'descent_end', 'rest_start', 'rest_end']
-    pDf['ascent_start']  = pd.to_datetime(pDf['ascent_start'])
-    pDf['ascent_end']    = pd.to_datetime(pDf['ascent_end'])
-    pDf['descent_start'] = pd.to_datetime(pDf['descent_start'])
-    pDf['descent_end']   = pd.to_datetime(pDf['descent_end'])
-    pDf['rest_start']    = pd.to_datetime(pDf['rest_start'])
-    pDf['rest_end']      = pd.to_datetime(pDf['rest_end'])
-    return pDf
+    return ReadProfileMetadataCached(fnm)
 
 #######################
 # Profile 'index list' generator
@@ -260,22 +263,32 @@ def ReadProfileMetadata(fnm):
 #######################
 def GenerateTimeWindowIndices(pDf, date0, date1, time0, time1):
     '''
-    Given two day boundaries and a time window (UTC) within a day: Return a list
+    Given two day boundaries and a time window (UTC) within a day: Return a NumPy array
     of indices of profiles that start within both the day and time bounds. This 
-    works from the passed dataframe of profile times.
+    works from the passed dataframe of profile times. Rows are in time order so the
+    day bounds are two binary searches on ascent_start; the time of day (nanoseconds
+    past midnight) is then tested as a mask over just the rows between those bounds.
     '''
-    nprofiles = len(pDf)
-    pIndices = []
-    for i in range(nprofiles):
-        a0 = pDf["ascent_start"][i]
-        if a0 >= date0 and a0 <= date1 + td64(1, 'D'):
-            delta_t = a0 - dt64(a0.date())
-            if delta_t >= time0 and delta_t <= time1: pIndices.append(i)
-    return pIndices
+    a0     = pDf["ascent_start"].values.astype('datetime64[ns]').view('int64')
+    day_ns = td64(1, 'D').astype('timedelta64[ns]').astype('int64')
+    i0     = np.searchsorted(a0, dt64(date0, 'ns').astype('int64'), side='left')
+    i1     = np.searchsorted(a0, dt64(date1, 'ns').astype('int64') + day_ns, side='right')
+    tod    = a0[i0:i1] % day_ns
+    inside = (tod >= td64(time0, 'ns').astype('int64')) & (tod <= td64(time1, 'ns').astype('int64'))
+    return i0 + np.flatnonzero(inside)
 
 ##################
 # Load the 2021 Oregon Slope Base profile metadata; and some March 2021 sensor datasets
 ##################
 
-# Note these are profile times for Axial Base
-p = ReadProfileMetadata(os.getcwd()+"/../Profiles/osb2021.csv")
+# Note these are profile times for Axial Base; read on first use
+@lru_cache(maxsize=None)
+def OSBProfiles2021():
+    '''The 2021 Oregon Slope Base profile metadata (p); read on the first call, then kept'''
+    return ReadProfileMetadata(os.getcwd()+"/../Profiles/osb2021.csv")
+
+
+def __getattr__(name):
+    '''SpectrophotometerModule.p: loaded on first use'''
+    if name == 'p': return OSBProfiles2021()
+    raise AttributeError("module 'SpectrophotometerModule' has no attribute " + repr(name))
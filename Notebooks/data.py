@@ -1,11 +1,57 @@
 import os, sys, time, glob, warnings
 from os.path import join as joindir
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np, pandas as pd, xarray as xr
 from numpy import datetime64 as dt64, timedelta64 as td64
 
 warnings.filterwarnings('ignore')
 
 
+def SortUnique(ds, dim='time', t0=None, t1=None):
+    """
+    Sort ds along dim, keep the first of any repeated dim values and (optionally) only [t0, t1].
+    The order comes from one np.unique of the dim values and is applied with isel, which for a
+    lazily opened file reads nothing: the variables are read in their new order when used,
+    e.g. one chunk at a time by WriteChunked(). Other dimensions (e.g. spectral wavelength)
+    are kept. Returns the new Dataset and the number of duplicates.
+    """
+    t    = ds[dim].values
+    keep = np.ones(len(t), dtype=bool)
+    if t0 is not None: keep &= t >= dt64(t0)
+    if t1 is not None: keep &= t <= dt64(t1)
+    window = np.flatnonzero(keep)
+    _, keeper_index = np.unique(t[window], return_index=True)
+    idx, nduplicates = window[keeper_index], len(window) - len(keeper_index)
+    if len(idx) == len(t) and (np.diff(idx) > 0).all(): return ds, nduplicates
+    return ds.isel({dim: idx}), nduplicates
+
+
+def WriteChunked(ds, outfnm, dim='time', chunk=1_000_000):
+    """
+    Write ds to NetCDF file outfnm chunk rows along dim at a time, so that a lazily opened
+    (e.g. SortUnique()) Dataset is held in memory one variable chunk at a time in place of one
+    whole variable at a time as with ds.to_netcdf(). dim becomes an unlimited dimension; times
+    are stored as int64 nanoseconds since 1970.
+    """
+    import netCDF4
+    ds = ds.copy()
+    for v in ds.variables.values():
+        v.encoding = {k: e for k, e in v.encoding.items() if k in ('dtype', '_FillValue', 'units', 'calendar', 'scale_factor', 'add_offset')}
+        if np.issubdtype(v.dtype, np.datetime64): 
+            v.encoding.update(units='nanoseconds since 1970-01-01', calendar='proleptic_gregorian', dtype='int64')
+    ds.isel({dim: slice(0, 0)}).to_netcdf(outfnm, unlimited_dims=[dim])
+
+    names = [n for n, v in ds.variables.items() if dim in v.dims]
+    with netCDF4.Dataset(outfnm, 'a') as nc:
+        nc.set_auto_maskandscale(False)
+        for i in range(0, ds.sizes[dim], chunk):
+            part = ds.isel({dim: slice(i, i + chunk)})
+            for name in names:
+                v    = xr.conventions.encode_cf_variable(part[name].variable, name=name)
+                axis = v.dims.index(dim)
+                nc.variables[name][(slice(None),)*axis + (slice(i, i + v.shape[axis]),)] = v.values
+
+
 def ReformatDataFile(verbose=False):
     """Read a NetCDF and reformat it, write the result"""
     print('\n\nSpecify input NetCDF data file\n')
@@ -86,12 +132,6 @@ def ReformatDataFile(verbose=False):
     for key in ds_attrs_dict: 
         if key not in attrs_to_preserve: ds.attrs.pop(key)
 
-    print('\n\nEnsure the new Dimension is sorted (no User action)\n')    
-    df   = ds.to_dataframe()
-    vals = [xr.DataArray(data=df[c], dims=['time'], coords={'time':df.index}, attrs=ds[c].attrs) for c in df.columns]
-    ds  = xr.Dataset(dict(zip(df.columns, vals)), attrs=ds.attrs)
-
-    
     print('\n\nSelect output time window (Format yyyy-mm-dd or enter to use the defaults)\n')
     t0_default, t1_default = '2022-01-01', '2022-02-01'
     t0 = input('start date (' + t0_default + ')')
@@ -100,12 +140,12 @@ def ReformatDataFile(verbose=False):
     if not len(t1): t1 = t1_default
     t0 = dt64(t0)
     t1 = dt64(t1)
-    ds = ds.sel(time=slice(t0, t1))
-    
-    # This code eliminates duplicate-time entries. See data.ipynb for remarks on 
-    #   sensor data.
-    _, keeper_index = np.unique(ds['time'], return_index=True)
-    ds=ds.isel(time=keeper_index)
+
+    # Sort on the new dimension, keep [t0, t1] and eliminate duplicate-time entries. See 
+    #   data.ipynb for remarks on sensor data.
+    print('\n\nEnsure the new Dimension is sorted (no User action)\n')
+    ds, nduplicates = SortUnique(ds, 'time', t0, t1)
+    if verbose: print(str(nduplicates) + ' duplicate times dropped')
 
     print('\n\nHere is the resulting dataset summary view:\n')
     print(ds)
@@ -115,11 +155,97 @@ def ReformatDataFile(verbose=False):
     # ds.z[0:10000].plot()
 
     outfnm = input('\n\nEnter an output file name. Include the .nc extension (or just enter to skip this): ')
-    if len(outfnm): ds.to_netcdf(outfnm)    
+    if len(outfnm): WriteChunked(ds, outfnm)
 
     return True
 
 
+##################
+#
+# Batch reformatting: ReformatDataFile() without the prompts
+#
+# A spec (a dict, or an entry of a YAML file) records the answers ReformatDataFile() asks for,
+#   once per instrument. ReformatTree() applies the specs to every NetCDF file under a folder,
+#   e.g. ../../data/rca/<site>/<structure>/<instrument>/*.nc, in a pool of worker processes.
+#   Example spec:
+#
+#   {'swap':       {'obs': 'time'},                 dimension to swap out: coordinate or variable to swap in
+#    'coords':     {'lat': None, 'lon': None},      None drops, a name renames, not listed is kept
+#    'data_vars':  {'sea_water_temperature': 'temperature', 'sea_water_temperature_qc_agg': None},
+#    'keep_attrs': ['node'],                        dataset attributes kept; all others are dropped
+#    't0': '2022-01-01', 't1': '2022-02-01'}        optional output time window, both ends included
+#
+##################
+
+def ReformatDataset(ds, spec, dim='time'):
+    '''
+    Reformat ds as ReformatDataFile() does, with the prompts answered by spec (see above).
+    Samples outside [t0, t1] and repeated dim values are dropped by SortUnique(), which also
+    sorts along dim. Returns the reformatted Dataset and the number of duplicates.
+    '''
+    for old_dim, new_dim in spec.get('swap', {}).items():
+        if old_dim in ds.dims and (new_dim in ds.data_vars or new_dim in ds.coords):
+            ds = ds.swap_dims({old_dim: new_dim})
+
+    for key in ('coords', 'data_vars'):
+        changes, names = spec.get(key, {}), list(getattr(ds, key))
+        ds = ds.drop_vars([c for c in changes if c in names and changes[c] is None])
+        ds = ds.rename({c: changes[c] for c in changes if c in names and changes[c] is not None})
+
+    keep_attrs = spec.get('keep_attrs', [])
+    ds.attrs   = {k: v for k, v in ds.attrs.items() if k in keep_attrs}
+    return SortUnique(ds, dim, spec.get('t0'), spec.get('t1'))
+
+
+def ReformatJob(infnm, outfnm, spec):
+    '''Reformat one file (worker of ReformatTree()); returns its report row'''
+    report = {'input': infnm, 'output': outfnm, 'rows_in': 0, 'rows_out': 0, 'duplicates': 0, 
+              'bytes': 0, 'seconds': 0., 'error': ''}
+    tic = time.time()
+    try:
+        with xr.open_dataset(infnm) as ds:
+            dim = spec.get('dim', 'time')
+            src = [old for old, new in spec.get('swap', {}).items() if new == dim and old in ds.dims]
+            report['rows_in'] = ds.sizes[src[0] if src else dim]           # rows along dim before the swap
+            ds, report['duplicates'] = ReformatDataset(ds, spec, dim)
+            report['rows_out'] = ds.sizes[dim]
+            os.makedirs(os.path.dirname(outfnm), exist_ok=True)
+            WriteChunked(ds, outfnm, dim)
+        report['bytes'] = os.path.getsize(outfnm)
+    except Exception as e: report['error'] = type(e).__name__ + ': ' + str(e)
+    report['seconds'] = time.time() - tic
+    return report
+
+
+def ReadReformatSpecs(fnm):
+    '''Per-instrument specs from a YAML file: a mapping of instrument folder name to spec'''
+    import yaml
+    with open(fnm) as f: return yaml.safe_load(f)
+
+
+def ReformatTree(root, specs, outdir, processes=None, pattern='**/*.nc', report=None):
+    '''
+    Reformat every NetCDF file under root matching pattern, writing each to the same relative
+    path under outdir. specs maps an instrument (the name of the folder holding the file, e.g.
+    'ctd') to its spec; a '*' entry applies to instruments not listed; files with no spec are
+    skipped. specs may also be a YAML file name (ReadReformatSpecs()). Files are done in a pool
+    of worker processes (default: one per core); a file that fails is reported, not raised.
+    Returns a DataFrame with one row per file (rows_in, rows_out, duplicates dropped, bytes
+    written, seconds, error); report is an optional CSV file name to save it to.
+    '''
+    if isinstance(specs, str): specs = ReadReformatSpecs(specs)
+    jobs = []
+    for infnm in sorted(glob.glob(joindir(root, pattern), recursive=True)):
+        spec = specs.get(os.path.basename(os.path.dirname(infnm)), specs.get('*'))
+        if spec is not None: jobs.append((infnm, joindir(outdir, os.path.relpath(infnm, root)), spec))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(ReformatJob, *job) for job in jobs]
+        results = pd.DataFrame([future.result() for future in futures], 
+                               columns=['input', 'output', 'rows_in', 'rows_out', 'duplicates', 'bytes', 'seconds', 'error'])
+    if report is not None: results.to_csv(report, index=False)
+    return results
+
+
 
 
 
@@ -137,18 +263,63 @@ def ReformatDataFile(verbose=False):
 
 
 
+# Shallow profiler phase detection parameters, shared by ProfCrawler() and ProfileDetector.
+#   Tuned for 1Min samples with z negative down from 0 at the surface. m0 and m1 are the
+#   lookback and lookahead windows (in samples) for the two slopes at each candidate index.
+m0 = 8
+m1 = 8
+ascent_threshold0 = 0.2
+ascent_threshold1 = .5
+ascent_min_depth = -170.
+ascent_bump_i = 10        # 7 "works" but a bit bigger is maybe no harm
+descent_threshold0 = -0.2
+descent_threshold1 = -0.5
+descent_bump_i = 10
+rest_threshold0 = -0.5                 # -.5, .2, -170 worked pretty well for r0
+rest_threshold1 = 0.2             
+rest_min_depth = -170.
+rest_bump_i = 10
+
+NOEVENT, ASCENT_START, DESCENT_START, REST_START = 0, 1, 2, 3
+
+
+def CrawlerSampleClasses(zv, icand):
+    """
+    Slope tests for the candidate indices icand of the depth array zv (which must include m0 
+    samples before the first and m1 samples after the last candidate). Returns two arrays 
+    aligned with icand:
+      kind         ASCENT_START, DESCENT_START, REST_START or NOEVENT, following the 
+                   if / elif / elif order of the tests: a sample that passes the ascent slope 
+                   test is not considered for descent or rest even if it fails the ascent 
+                   depth test
+      final_rest   the rest test on its own, used to close the last descent
+    """
+    slope0 = (zv[icand] - zv[icand - m0])/m0
+    slope1 = (zv[icand + m1] - zv[icand])/m1
+    ascent_slope  = (slope0 <= ascent_threshold0) & (slope1 >= ascent_threshold1)
+    descent_slope = (slope0 >= descent_threshold0) & (slope1 <= descent_threshold1) & ~ascent_slope
+    final_rest    = (slope0 <= rest_threshold0) & (np.abs(slope1) <= rest_threshold1) & (zv[icand] <= rest_min_depth)
+    kind = np.full(len(icand), NOEVENT, dtype=np.int8)
+    kind[final_rest & ~ascent_slope & ~descent_slope] = REST_START
+    kind[descent_slope] = DESCENT_START
+    kind[ascent_slope & (zv[icand] <= ascent_min_depth)] = ASCENT_START
+    return kind, final_rest
+
+
 def ProfCrawler(z, t, verbose = False):
     """
     ProfileCrawler traverses pandas Series s of pressures/depths and matching pandas Series t of times.
     The code is adapted to 1Min per sample and z is increasing up / shallow. (See 'z_direction'.)
     The code returns a set of 6 lists: t0/t1 for ascent, descent and rest intervals
     """
-    print(str(z[0]) + ' is initial depth')
+    z0 = z.iloc[0] if isinstance(z, pd.Series) else z[0]
+    t0 = t.iloc[0] if isinstance(t, pd.Series) else t[0]
+    print(str(z0) + ' is initial depth')
 
     len_z = len(z)
     a0, d0, r0 = [], [], []               # lists for start times: ascents, descents, rests
     
-    r0.append((0,t[0],z[0]))
+    r0.append((0,t0,z0))
 
     # Goal is to return 6 lists: r0, r1, a0, a1, d0, d1
     # List entries are triples (i, t, z): Index of, time of, and depth of.
@@ -167,49 +338,33 @@ def ProfCrawler(z, t, verbose = False):
     #   After a detection of ascent start the i search index is bumped forward in time to avoid
     #   subsequent false positives.
     
-    m0 = 8
-    m1 = 8
-    ascent_threshold0 = 0.2
-    ascent_threshold1 = .5
-    ascent_min_depth = -170.
-    ascent_bump_i = 10        # 7 "works" but a bit bigger is maybe no harm
-    descent_threshold0 = -0.2
-    descent_threshold1 = -0.5
-    descent_bump_i = 10
-    rest_threshold0 = -0.5                 # -.5, .2, -170 worked pretty well for r0
-    rest_threshold1 = 0.2             
-    rest_min_depth = -170.
-    rest_bump_i = 10
-
-    # This pushes the index forward after an a0 is detected to skip some false positives
-    ascent_threshold0 = 0.2
-    ascent_threshold1 = .5
-    
-    i = m0
-    while i < len_z - m1:      # i is a candidate index for A/D/R starts
-        
-        slope0 = (z[i] - z[i-m0])/m0
-        slope1 = (z[i+m1] - z[i])/m1
-        
-        if slope0 <= ascent_threshold0 and slope1 >= ascent_threshold1:
-            if z[i] <= ascent_min_depth:
-                a0.append((i, t[i], z[i]))
-                i += ascent_bump_i
-                
-        elif slope0 >= descent_threshold0 and slope1 <= descent_threshold1:        
-            # (no depth condition) so on to the cases where this is considered a new descent:
-            #   No descents found yet OR the most recent descent precedes the most recent ascent
+    # The slope tests are done for every candidate index i = m0 ... len_z - m1 - 1 at once;
+    #   see CrawlerSampleClasses().
+    zv = np.asarray(z, dtype=np.float64)
+    tt = t.iloc if isinstance(t, pd.Series) else t
+    zz = z.iloc if isinstance(z, pd.Series) else zv
+    icand = np.arange(m0, max(len_z - m1, m0))
+    kind, final_rest = CrawlerSampleClasses(zv, icand)
+
+    # Post-pass over the (few) candidate indices in time order: The bump-forward after each
+    #   detection and the alternation rules (a descent must follow an ascent, a rest must follow 
+    #   a descent) depend on what was accepted before, so this part is sequential. Indices 
+    #   skipped by a bump are never examined, exactly as in a one-index-at-a-time scan.
+    next_i = m0
+    for k in np.flatnonzero(kind):
+        i = int(icand[k])
+        if i < next_i: continue
+        if kind[k] == ASCENT_START:
+            a0.append((i, tt[i], zz[i]))
+            next_i = i + ascent_bump_i + 1
+        elif kind[k] == DESCENT_START:
             if (not len(d0)) or (len(a0) and len(d0) and d0[-1][0] < a0[-1][0]):
-                d0.append((i, t[i], z[i]))
-                i += descent_bump_i
-                
-        elif slope0 <= rest_threshold0 and abs(slope1) <= rest_threshold1:
-            if z[i] <= rest_min_depth:
-                if (not len(r0)) or (len(d0) and len(r0) and r0[-1][0] < d0[-1][0]):
-                    r0.append((i, t[i], z[i]))
-                    i += rest_bump_i
-
-        i += 1
+                d0.append((i, tt[i], zz[i]))
+                next_i = i + descent_bump_i + 1
+        else:
+            if (not len(r0)) or (len(d0) and len(r0) and r0[-1][0] < d0[-1][0]):
+                r0.append((i, tt[i], zz[i]))
+                next_i = i + rest_bump_i + 1
 
     if verbose: print("there are", len(a0), "ascent starts")
     if verbose: print("there are", len(d0), "descent starts")
@@ -219,16 +374,12 @@ def ProfCrawler(z, t, verbose = False):
     d1 = r0[1:].copy()         # first descent ends at start of 2nd rest start
     r1 = a0.copy()             # first rest end = first ascent start
 
-    # The final d1 must still be determined
-    i = d0[-1][0] + m0
-    while i < len_z - m1:
-        slope0 = (z[i] - z[i-m0])/m0
-        slope1 = (z[i+m1] - z[i])/m1
-        if slope0 <= rest_threshold0 and abs(slope1) <= rest_threshold1:
-            if z[i] <= rest_min_depth:
-                d1.append((i, t[i], z[i]))
-                i = len_z - m1
-        i += 1
+    # The final d1 must still be determined: the first rest-type sample after the last descent start
+    if len(d0):
+        final = np.flatnonzero((icand >= d0[-1][0] + m0) & final_rest)
+        if len(final):
+            i = int(icand[final[0]])
+            d1.append((i, tt[i], zz[i]))
                 
     # redacted: logic check on order of stamp indices
     # Returning lists of tuples: (index, time, depth)
@@ -276,4 +427,121 @@ def ProfileWriter(ofnm, a0, a1, d0, d1, r0, r1):
     df = pd.DataFrame(data=np.array([np.array(x) for x in profiles]))
     df.to_csv(ofnm)
 
-    return True
\ No newline at end of file
+    return True
+
+
+
+class ProfileDetector:
+    """
+    Streaming form of ProfCrawler(): Feed() it consecutive blocks of a depth time series and it
+    returns each profile as soon as the profile is complete, i.e. when the next rest start has
+    been found. A profile is the 18-value row written by ProfileWriter(): (index, time, depth)
+    for rest start, rest end (= ascent start), ascent start, ascent end (= descent start),
+    descent start, descent end (= next rest start). Indices count samples from the start of the
+    stream. Close() returns the last profile, ended as in ProfCrawler() by the first rest-type
+    sample after the final descent start. Fed block-by-block or all at once the events are
+    those of ProfCrawler().
+
+    Memory is bounded: between blocks only the last m0 + m1 samples are kept (so the slope
+    windows span block boundaries), plus the bump-forward position, the most recent ascent,
+    descent and rest starts not yet written out, and the pending end of the latest descent.
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.zbuf, self.tbuf = np.zeros(0), np.zeros(0, dtype='datetime64[ns]')
+        self.g0      = 0              # stream index of zbuf[0]
+        self.scan_i  = m0             # first stream index not yet examined
+        self.next_i  = m0             # bump-forward: next index that may hold an event
+        self.a0, self.d0, self.r0 = [], [], []          # starts not yet written out
+        self.last_a0 = self.last_d0 = self.last_r0 = None
+        self.final   = None           # first rest-type sample after last_d0 + m0
+        self.nprofiles = 0
+
+    def Event(self, i):
+        j = i - self.g0
+        return (i, pd.Timestamp(self.tbuf[j]), self.zbuf[j])
+
+    def Profiles(self):
+        """Pop the profiles that are complete: each needs the following rest start"""
+        rows = []
+        while len(self.r0) > 1 and len(self.a0) and len(self.d0):
+            r0, r1, a0, d0 = self.r0.pop(0), self.r0[0], self.a0.pop(0), self.d0.pop(0)
+            rows.append([*r0, *a0, *a0, *d0, *d0, *r1])
+        self.nprofiles += len(rows)
+        return rows
+
+    def Feed(self, z, t):
+        """Process the next block of depths z and times t; returns the newly completed profiles"""
+        z, t = np.asarray(z, dtype=np.float64), np.asarray(t).astype('datetime64[ns]')
+        if not len(z): return []
+        if self.g0 == 0 and not len(self.zbuf):
+            if self.verbose: print(str(z[0]) + ' is initial depth')
+            self.r0.append((0, pd.Timestamp(t[0]), z[0]))
+            self.last_r0 = 0
+        self.zbuf, self.tbuf = np.concatenate((self.zbuf, z)), np.concatenate((self.tbuf, t))
+
+        g1    = self.g0 + len(self.zbuf)
+        icand = np.arange(max(self.scan_i, m0), max(g1 - m1, self.scan_i))
+        if len(icand):
+            kind, final_rest = CrawlerSampleClasses(self.zbuf, icand - self.g0)
+            for k in np.flatnonzero(kind):
+                i = int(icand[k])
+                if i < self.next_i: continue
+                if kind[k] == ASCENT_START:
+                    self.a0.append(self.Event(i))
+                    self.last_a0, self.next_i = i, i + ascent_bump_i + 1
+                elif kind[k] == DESCENT_START:
+                    if self.last_d0 is None or (self.last_a0 is not None and self.last_d0 < self.last_a0):
+                        self.d0.append(self.Event(i))
+                        self.last_d0, self.next_i, self.final = i, i + descent_bump_i + 1, None
+                else:
+                    if self.last_r0 is None or (self.last_d0 is not None and self.last_r0 < self.last_d0):
+                        self.r0.append(self.Event(i))
+                        self.last_r0, self.next_i = i, i + rest_bump_i + 1
+            if self.last_d0 is not None and self.final is None:
+                after = np.flatnonzero((icand >= self.last_d0 + m0) & final_rest)
+                if len(after): self.final = self.Event(int(icand[after[0]]))
+            self.scan_i = int(icand[-1]) + 1
+
+        # keep just enough history for the lookback window of the next candidate
+        keep_from = max(self.scan_i - m0, self.g0)
+        self.zbuf, self.tbuf = self.zbuf[keep_from - self.g0:], self.tbuf[keep_from - self.g0:]
+        self.g0 = keep_from
+        return self.Profiles()
+
+    def Close(self):
+        """End of stream: the final descent ends at the first rest-type sample after it"""
+        rows = self.Profiles()
+        if self.final is not None and len(self.r0) == 1 and len(self.a0) and len(self.d0):
+            r0, a0, d0 = self.r0.pop(0), self.a0.pop(0), self.d0.pop(0)
+            rows.append([*r0, *a0, *a0, *d0, *d0, *self.final])
+            self.nprofiles += 1
+        if self.verbose: print('detected', self.nprofiles, 'profiles')
+        return rows
+
+
+def StreamProfiles(sourcefnm, z, ofnm, block=7*1440, verbose=True):
+    """
+    Segment the depth variable z of a (possibly multi-year) NetCDF file into profiles, reading 
+    it in blocks of 'block' samples (default one week at 1Min) and appending each profile to the 
+    CSV file ofnm as soon as it is complete. The CSV has the layout written by ProfileWriter().
+    Example: n = StreamProfiles('osb_ctd_pressure_2014_2022.nc', 'z', 'osb_profiles.csv')
+    Returns the number of profiles written.
+    """
+    ds = xr.open_dataset(sourcefnm)
+    detector = ProfileDetector(verbose)
+    nrow = 0
+    with open(ofnm, 'w') as f:
+        f.write(',' + ','.join(str(c) for c in range(18)) + '\n')
+        def write(rows):
+            nonlocal nrow
+            for row in rows:
+                f.write(str(nrow) + ',' + ','.join(str(x) for x in row) + '\n')
+                nrow += 1
+        for i in range(0, ds.sizes['time'], block):
+            part = ds[z].isel(time=slice(i, i + block))
+            write(detector.Feed(part.values, part['time'].values))
+        write(detector.Close())
+    ds.close()
+    return nrow
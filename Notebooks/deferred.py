@@ -0,0 +1,34 @@
+##################
+#
+# Deferred imports
+#
+# The notebook modules make matplotlib, ipywidgets, traitlets and IPython.display available
+#   under their usual names (plt, widgets, interact, HTML, ...). Importing those packages
+#   takes longer than the rest of a module and needs a display; batch workers that only call
+#   the data functions never use them. A Deferred stands in for such a module, or for one
+#   name in it, and imports it the first time it is used.
+#
+##################
+
+import importlib
+
+
+class Deferred:
+    '''
+    Stand-in for a module, or a name in a module, that is imported when first used:
+        plt  = Deferred('matplotlib.pyplot')            plt.subplots(...) imports pyplot
+        HTML = Deferred('IPython.display', 'HTML')      HTML(s) imports IPython.display
+    After the first use the module is in sys.modules and each access is a dictionary lookup.
+    '''
+    def __init__(self, module, name=None):
+        self.__dict__['_module'], self.__dict__['_name'] = module, name
+
+    def _resolve(self):
+        m = importlib.import_module(self._module)
+        return m if self._name is None else getattr(m, self._name)
+
+    def __getattr__(self, attr): return getattr(self._resolve(), attr)
+
+    def __call__(self, *args, **kwargs): return self._resolve()(*args, **kwargs)
+
+    def __repr__(self): return '<deferred ' + self._module + ('' if self._name is None else '.' + self._name) + '>'
@@ -1,89 +1,75 @@
-def ProfileCrawler(s, t, verbose = False):
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, pandas as pd, xarray as xr
+from numpy import datetime64 as dt64, timedelta64 as td64
+
+def doy(theDatetime): return 1 + int((theDatetime - dt64(str(theDatetime)[0:4] + '-01-01')) / td64(1, 'D'))
+
+
+def ProfileEvents(s, t, verbose = False, threshold = 1.):
     """
-    ProfileCrawler traverses a passed pandas Series s of pressures and Series t of corresponding times.
-    The code was built using data sampled at about 1-minute intervals. Goal: Infer (and return as lists)
-        the start and end times for ascent, descent and rest intervals.
+    ProfileEvents finds ascent, descent and rest starts in pressures s (array or Series) with
+    matching times t (datetime64 or int64 ns). Returns three int64 arrays of sample indices into s.
+    The slope tests of ProfileCrawler() are evaluated for all samples at once; only the culling
+    of false positive rest starts is sequential, as a single forward pass.
     """
-
-    # pandas series, just pressures
+    s, t = np.asarray(s, dtype=float), np.asarray(t).astype('datetime64[ns]').view('int64')
     len_s = len(s)
-    threshold = 1.
-    a0, d0, r0 = [], [], []               # start times for ascents, descents, rests
-
-    for i in range(1, len_s - 5):         # 6 minute window
-        
-        # catch ascent
-        if s[i-1] - s[i]   <= threshold and  \
-           s[i]   - s[i+1] >= threshold and  \
-           s[i+1] - s[i+2] >= threshold and  \
-           s[i+2] - s[i+3] >= threshold and  \
-           s[i+3] - s[i+4] >= threshold and  \
-           s[i+4] - s[i+5] >= threshold:
-            a0.append((i,t[i]))
-
-        # catch descent
-        if s[i-1] - s[i]   >= threshold and  \
-           s[i]   - s[i+1] <= threshold and  \
-           s[i+1] - s[i+2] <= threshold and  \
-           s[i+2] - s[i+3] <= threshold and  \
-           s[i+3] - s[i+4] <= threshold and  \
-           s[i+4] - s[i+5] <= threshold:
-            d0.append((i,t[i]))
-
-        # this variant is a little too liberal; false positives ~25%
-        # why? Because twice daily there are stops on the way down for pH
-        # catch rest
-        if i >= 5 and \
-           s[i-5] - s[i-4] <= -threshold and  \
-           s[i-4] - s[i-3] <= -threshold and  \
-           s[i-3] - s[i-2] <= -threshold and  \
-           s[i-2] - s[i-1] <= -threshold and  \
-           s[i-1] - s[i]   <= -threshold and  \
-           s[i]   - s[i+1] >= -threshold:
-            r0.append((i,t[i]))
-
-            
+    if len_s < 7: return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # ds[k] = s[k] - s[k+1]; a window of five consecutive tests starting at k is win(...)[k]
+    ds   = s[:-1] - s[1:]
+    win  = lambda m: np.lib.stride_tricks.sliding_window_view(m, 5).all(axis=1)
+    up, dn, sink = ds >= threshold, ds <= threshold, ds <= -threshold
+    i    = np.arange(1, len_s - 5)                   # 6 minute window, as in ProfileCrawler()
+    a0   = i[dn[i-1] & win(up)[i]]                   # catch ascent
+    d0   = i[up[i-1] & win(dn)[i]]                   # catch descent
+    ir   = np.arange(5, len_s - 5)                   # catch rest (~25% false positives: pH stops)
+    r0   = ir[win(sink)[ir-5] & (ds[ir] >= -threshold)]
+
     if verbose: print("there are", len(a0), "ascent starts")
     if verbose: print("there are", len(d0), "descent starts")
     if verbose: print("there are", len(r0), "rest starts: now culling extras")
 
-    # keep running the "rest start" list looking for...
-    #     ...relative to this particular rest start...
-    #     ...a future rest start earlier than the next ascent start
-    #         ...if found: delete this particular rest start...
-    #             ...and begin again at the top
-    # this winnows away false positive rest starts
-    while True: 
-        profile_counter = 1               
-        for i in range(len(r0)-1):
-            if profile_counter >= len(a0) - 1: break
-            if r0[i+1][1] < a0[profile_counter][1]: 
-                r0.remove(r0[i])
-                break
-            else: profile_counter += 1
-        if profile_counter >= len(a0) - 1: break
-
+    # a rest start is a false positive if the next rest start is still earlier than the next
+    #   ascent start; walk the rest starts once against a pointer c into the ascent starts
+    keep, c, cur = np.ones(len(r0), dtype=bool), 1, 0
+    ta0, tr0 = t[a0], t[r0]
+    for nxt in range(1, len(r0)):
+        if c >= len(a0) - 1: break
+        if tr0[nxt] < ta0[c]: keep[cur] = False
+        else:                 c += 1
+        cur = nxt
+    r0 = r0[keep]
 
     if verbose: print("there are", len(a0), "ascent starts")
     if verbose: print("there are", len(d0), "descent starts")
     if verbose: print("there are", len(r0), "rest starts")
-                   
+
+    # logic check on results: ascent start later than descent start, descent start later than
+    #   rest start, ascent end later than descent end (a1 = d0, d1 = r0)
+    if verbose:
+        n = min(len(a0), len(d0), len(r0))
+        print("causal error counts:", int(np.sum(a0[:n] >= d0[:n])), int(np.sum(d0[:n] >= r0[:n])), int(np.sum(d0[:n] >= r0[:n])))
+        print(len(a0), len(d0), len(r0))
+
+    return a0, d0, r0
+
+
+def ProfileCrawler(s, t, verbose = False):
+    """
+    ProfileCrawler traverses a passed pandas Series s of pressures and Series t of corresponding times.
+    The code was built using data sampled at about 1-minute intervals. Goal: Infer (and return as lists)
+        the start and end times for ascent, descent and rest intervals. See ProfileEvents().
+    """
+    a0, d0, r0 = ProfileEvents(s, t, verbose)
+    t  = pd.Series(t).reset_index(drop=True)
+    a0 = [(int(i), t[i]) for i in a0]
+    d0 = [(int(i), t[i]) for i in d0]
+    r0 = [(int(i), t[i]) for i in r0]
     a1 = d0.copy()             # ascent end = descent start
     d1 = r0.copy()             # descent end = rest start
     r1 = a0[1:].copy()         # rest end = next ascent start (cuts off end of year)
-       
-    # logic check on results
-    causal_errors = [0]*3                 # list [0, 0, 0] tracks 3 types of possible error
-    smallest = len(a0)
-    if len(d0) < smallest: smallest = len(d0)
-    if len(r0) < smallest: smallest = len(r0)
-    for i in range(smallest):
-        if a0[i][0] >= d0[i][0]: causal_errors[0] += 1    # ascent start later than descent start
-        if d0[i][0] >= r0[i][0]: causal_errors[1] += 1    # descent start later than rest start
-        if a1[i][0] >= d1[i][0]: causal_errors[2] += 1    # ascent end later than descent end (???)
-   
-    if verbose: print("causal error counts:", causal_errors[0], causal_errors[1], causal_errors[2])
-    if verbose: print(len(a0), len(d0), len(r0))
 
     # Returning lists of tuples: (index, time)
     return a0, a1, d0, d1, r0, r1
@@ -97,17 +83,19 @@ def PrintProfileStatistics(a0, a1, d0, d1, r0, r1):
     is a list of tuples. The first element of the tuple is the index of the time in the 
     source data array. The second value is the timestamp for that same element. 
     """
-    one_sec = np.timedelta64(1, 's')
-    D_asc  = [(dt64(a1[i][1])-dt64(a0[i][1]))/one_sec for i in range(len(a1))]
-    D_dsc  = [(dt64(d1[i][1])-dt64(d0[i][1]))/one_sec for i in range(len(d1))]
-    D_rst  = [(dt64(r1[i][1])-dt64(r0[i][1]))/one_sec for i in range(len(r1))]
+    # pair each end with its start; the lists can differ in length (r1 is a0[1:])
+    times  = lambda v, n: np.asarray([e[1] for e in v[:n]], dtype='datetime64[ns]')
+    minute = np.timedelta64(1, 'm')
+    span   = lambda x0, x1: (times(x1, min(len(x0), len(x1))) - times(x0, min(len(x0), len(x1)))) / minute
+    D_asc, D_dsc, D_rst = span(a0, a1), span(d0, d1), span(r0, r1)
 
     print('Means, standard deviation for profile phases, in minutes:')
-    print('  Ascents:  ', round(np.mean(D_asc)/60., 2), round(np.std(D_asc)/60., 2))
-    print('  Descents: ', round(np.mean(D_dsc)/60., 2), round(np.std(D_dsc)/60., 2))
-    print('  Rests:    ', round(np.mean(D_rst)/60., 2), round(np.std(D_rst)/60., 2))
+    print('  Ascents:  ', round(np.mean(D_asc), 2), round(np.std(D_asc), 2))
+    print('  Descents: ', round(np.mean(D_dsc), 2), round(np.std(D_dsc), 2))
+    print('  Rests:    ', round(np.mean(D_rst), 2), round(np.std(D_rst), 2))
     print()
     print('(Recall that two profiles of nine each day have slower, staged descents)')
+    print('(profileindex.ProfileDurations() and DurationRollups() give these per profile and per period)')
     print()
     
 
@@ -134,227 +122,184 @@ def PrintProfileEntry(profile):
 
     
     
+def PairIntervals(i0, i1, t, limit):
+    """
+    Pair each interval start i0 (sample indices, in time order) with the first end i1 later than it;
+    t is the int64 ns time axis and limit a maximum duration. Returns (start, end) index arrays
+    of the pairs shorter than limit. Pairing stops at the first start that has no later end, and
+    a start with the same time as the previously accepted start is skipped.
+    """
+    t0, t1 = t[i0], t[i1]
+    k      = np.searchsorted(t1, t0, side='right')             # first end later than each start
+    n      = int(np.argmax(k >= len(t1))) if (k >= len(t1)).any() else len(k)
+    t0, k  = t0[:n], k[:n]
+    ok     = t1[k] < t0 + limit
+    start, end = i0[:n][ok], i1[k[ok]]
+    repeat = np.concatenate(([False], t[start][1:] == t[start][:-1]))
+    return start[~repeat], end[~repeat]
+
+
+def AssembleProfiles(ascents, descents, rests, t):
+    """
+    Chain paired intervals (from PairIntervals()) into profiles: an ascent whose end is a descent
+    start, and that descent's end is a rest start. Returns an (n, 6) array of sample indices:
+    ascent start, ascent end, descent start, descent end, rest start, rest end. Profiles that start
+    before the prior profile's rest ends are then removed (time slips: several ascent starts detected
+    for one actual ascent, giving more than nine profiles per day); also returns that count.
+    """
+    (a0, a1), (d0, d1), (r0, r1) = ascents, descents, rests
+    if not len(a0) or not len(d0) or not len(r0): return np.zeros((0, 6), dtype=np.int64), 0
+
+    # merge: each ascent end against the sorted descent starts, each descent end against the rest starts
+    di    = np.searchsorted(t[d0], t[a1], side='left')
+    dc    = np.clip(di, 0, len(d0)-1)
+    dhit  = (di < len(d0)) & (t[d0[dc]] == t[a1])
+    ri    = np.searchsorted(t[r0], t[d1[dc]], side='left')
+    rc    = np.clip(ri, 0, len(r0)-1)
+    rhit  = dhit & (ri < len(r0)) & (t[r0[rc]] == t[d1[dc]])
+    stop  = (di >= len(d0)) | (dhit & (ri >= len(r0)))         # the source data ran out
+    n     = int(np.argmax(stop)) if stop.any() else len(a0)
+    hit   = np.flatnonzero(rhit[:n])
+    profiles = np.stack((a0[hit], a1[hit], d0[dc[hit]], d1[dc[hit]], r0[rc[hit]], r1[rc[hit]]), axis=1)
+
+    # time slips, one pass: keep a profile only if it starts at or after the last kept rest end
+    keep, last_end = np.ones(len(profiles), dtype=bool), np.iinfo(np.int64).min
+    starts, ends = t[profiles[:, 0]], t[profiles[:, 5]]
+    for i in range(len(profiles)):
+        if starts[i] < last_end: keep[i] = False
+        else:                    last_end = ends[i]
+    return profiles[keep], int(np.sum(~keep))
+
+
+def ProfileSiteYear(sourcefnm, site, yr, outdir=None, pname='sea_water_pressure_profiler_depth_enabled', verbose=True):
+    """
+    Generate the Profile CSV file for one site and one year; this is the unit of work for both
+    ProfileWriter() (serial) and ProfileBatch() (process pool). Only the year's time window of
+    sourcefnm is read. The CSV goes to outdir (default ../Profiles) as site + year + '.csv'.
+    Returns a dictionary of diagnostics:
+      site, year            as passed
+      n_a0, n_d0, n_r0      interval starts found by ProfileEvents()
+      n_ascents ...         intervals that pass the 2 hour limit, per phase
+      n_profiles            profiles written
+      n_time_slips          profiles removed because they start before the prior rest ends
+      doubled_index         first profile with the same ascent start as the next, -1 if none
+      consistent            True if every ascent end = descent start and descent end = rest start
+      fail_index            first profile that is not, -1 if none
+      histogram             profiles per day of year (366 values, index 0 is doy 1)
+      n_nine                days with the expected nine profiles
+      more_than_nine        days of year (1, 2, ...) with more than nine profiles
+      csv                   output file name, None if the year was abandoned
+    """
+    if outdir is None: outdir = os.getcwd() + '/../Profiles/'
+    yrstr   = str(yr)
+    yrpostr = str(yr+1)
+    result  = {'site': site, 'year': yr, 'n_a0': 0, 'n_d0': 0, 'n_r0': 0, 'n_ascents': 0, 'n_descents': 0, 'n_rests': 0, \
+               'n_profiles': 0, 'n_time_slips': 0, 'doubled_index': -1, 'consistent': True, 'fail_index': -1, \
+               'histogram': np.zeros(366, dtype=int), 'n_nine': 0, 'more_than_nine': [], 'csv': None}
+
+    with xr.open_dataset(sourcefnm) as ds:
+        dsyr = ds[pname].sel(time=slice(dt64(yrstr + '-01-01'), dt64(yrpostr + '-01-01'))).load()
+
+    t = dsyr.time.values.astype('datetime64[ns]').view('int64')
+    a0, d0, r0 = ProfileEvents(dsyr.values, t, verbose)
+    a1, d1, r1 = d0, r0, a0[1:]              # ascent end = descent start and so on
+    result['n_a0'], result['n_d0'], result['n_r0'] = len(a0), len(d0), len(r0)
+
+    if verbose: print(len(a0), len(d0), len(r0), 'interval starts')
+    if verbose: print(len(a1), len(d1), len(r1), 'interval ends')
+
+    if len(a0) < 10 or len(a1) < 10 or len(d0) < 10 or len(d1) < 10 or len(r0) < 10 or len(r1) < 10:
+        if verbose: print('\nNo data: Abandoning this site + year:', site, yrstr, '\n')
+        return result
+
+    # we have intervals; do they match? Assume not always. Here is a checking function:
+    # CompareShallowProfilerTimestamps(a0, a1, d0, d1, r0, r1)
+    limit    = td64(2, 'h').astype('timedelta64[ns]').astype(np.int64)
+    ascents  = PairIntervals(a0, a1, t, limit)
+    descents = PairIntervals(d0, d1, t, limit)
+    rests    = PairIntervals(r0, r1, t, limit)
+
+    if verbose: print("found", len(ascents[0]), 'good ascents')
+    if verbose: print("found", len(descents[0]), 'good descents')
+    if verbose: print("found", len(rests[0]), 'good rests')
+
+    # profiles is (n, 6) sample indices into the source data (typically at "1Min" sampling):
+    #   ascend start, ascend end, descend start, descend end, rest start, rest end
+    profiles, nTimeSlipsRemoved = AssembleProfiles(ascents, descents, rests, t)
+    pt = t[profiles]
+
+    # duplicated profile ascent start times
+    doubled = np.flatnonzero(pt[1:, 0] == pt[:-1, 0])
+    doubled_index = int(doubled[0]) if len(doubled) else -1
+
+    if verbose:
+        if doubled_index >= 0: PrintProfileEntry([x for k in range(6) for x in (profiles[doubled_index, k], pt[doubled_index, k].astype('datetime64[ns]'))])
+        else: print('no doubling of profile ascent starts found')
+
+    # non-matching Timestamp sequences: from ascent to descent and descent to rest
+    failed       = np.flatnonzero((pt[:, 1] != pt[:, 2]) | (pt[:, 3] != pt[:, 4]))
+    double_check = not len(failed)
+    fail_index   = int(failed[0]) if len(failed) else -1
+
+    # histogram of profiles by doy (index 0 is doy 1); assumes at most one year of data
+    days = pt[:, 0].view('datetime64[ns]').astype('datetime64[D]')
+    profile_histogram = np.bincount((days - days.astype('datetime64[Y]').astype('datetime64[D]')).astype(int), minlength=366)[:366]
+
+    # days with more than nine profiles, which is not really possible: false positives got through
+    more_than_nine = [int(i) + 1 for i in np.flatnonzero(profile_histogram > 9)]     # as doy 1, 2, 3...
+
+    csvfnm = os.path.join(outdir, site + yrstr + '.csv')
+    df = pd.DataFrame({c: (profiles[:, c//2] if c % 2 == 0 else pt[:, c//2].view('datetime64[ns]')) for c in range(12)})
+    df.to_csv(csvfnm)
+
+    result.update({'n_ascents': len(ascents[0]), 'n_descents': len(descents[0]), 'n_rests': len(rests[0]), \
+                   'n_profiles': len(profiles), 'n_time_slips': nTimeSlipsRemoved, 'doubled_index': doubled_index, \
+                   'consistent': double_check, 'fail_index': fail_index, 'histogram': profile_histogram, \
+                   'n_nine': int(np.sum(profile_histogram == 9)), 'more_than_nine': more_than_nine, 'csv': csvfnm})
+    if verbose: PrintSiteYearDiagnostics(result)
+    return result
+
+
+def PrintSiteYearDiagnostics(result):
+    """Print the diagnostics dictionary returned by ProfileSiteYear()"""
+    print("arrived at", result['n_profiles'], 'good candidate profiles')
+    print("after removing", result['n_time_slips'], 'due to time slip error')
+    if result['consistent']: print('transitions are self-consistent')
+    else: print('double check failed at element', result['fail_index'])
+    print('of 365 days,', result['n_nine'], 'have nine profiles as desired')
+    print('...and', len(result['more_than_nine']), 'had more than nine profiles')
+    for this_doy in result['more_than_nine']: print("doy", this_doy, "had more than nine profiles")
+
+
 def ProfileWriter(sourcefnm, s, y0, yN, verbose=True):
     """
-    Generate Profile CSV files for sites x years. 
+    Generate Profile CSV files for one site x years. 
     Example: result = ProfileWriter('source.nc', 'axb', 2015, 2021)
       sourcefnm is a NetCDF file containing pressure/depth and time
-      s is a list of sites (strings)
+      s is a site (string)
       y0, yN give an inclusive year range
+    Returns the list of ProfileSiteYear() diagnostics, one per year.
+    """
+    return [ProfileSiteYear(sourcefnm, s, yr, verbose=verbose) for yr in range(y0, yN+1)]
+
+
+def ProfileBatch(jobs, outdir=None, pname='sea_water_pressure_profiler_depth_enabled', processes=None):
     """
-    ds = xr.open_dataset(sourcefnm)
-    for yr in range(y0, yN+1):
-        yrstr   = str(yr)
-        yrpostr = str(yr+1)
-        dsyr    = ds.sel(time=slice(dt64(yrstr + '-01-01'), dt64(yrpostr + '-01-01')))
-
-        
-        # LEFT OFF HERE PARAMETERIZE pressure i.e. dsyr[pname]
-
-
-        a0, a1, d0, d1, r0, r1 = \
-            ProfileCrawler(dsyr.sea_water_pressure_profiler_depth_enabled.to_series(), \
-                           dsyr.time.to_series(), True)
-
-        print(len(a0), len(d0), len(r0), 'interval starts')
-        print(len(a1), len(d1), len(r1), 'interval ends')
-
-
-        if len(a0) < 10 or len(a1) < 10 or len(d0) < 10 or len(d1) < 10 or len(r0) < 10 or len(r1) < 10:
-            print()
-            print('No data: Abandoning this site + year:', site, yrstr)
-            print()
-        else:
-
-            # we have intervals; do they match? Assume not always. Here is a checking function:
-            # CompareShallowProfilerTimestamps(a0, a1, d0, d1, r0, r1)
-
-            ascents, descents, rests = [], [], []
-            day_td64                 = pd.to_timedelta(1, unit='D')
-            ascent_limit             = pd.to_timedelta(2, unit='H')
-            descent_limit            = pd.to_timedelta(2, unit='H')
-            rest_limit               = pd.to_timedelta(2, unit='H')
-            prior_ascent_start       = a0[0][1] - day_td64
-            prior_descent_start      = d0[0][1] - day_td64
-            prior_rest_start         = r0[0][1] - day_td64
-
-            end_index = 0     # index into a1
-            for i in range(len(a0)):
-                all_done = False
-                this_start_time = a0[i][1]
-                if this_start_time > prior_ascent_start:
-                    while a1[end_index][1] <= this_start_time: 
-                        end_index += 1
-                        if end_index >= len(a1):
-                            all_done = True
-                            break
-                    if all_done: break
-                    this_end_time = a1[end_index][1]
-                    if this_end_time < this_start_time + ascent_limit:
-                        prior_ascent_start = this_start_time
-                        ascents.append([a0[i][0], this_start_time, a1[end_index][0], this_end_time])
-                if all_done: break
-
-            end_index = 0     # index into d1
-            for i in range(len(d0)):
-                all_done = False
-                this_start_time = d0[i][1]
-                if this_start_time > prior_descent_start:
-                    while d1[end_index][1] <= this_start_time: 
-                        end_index += 1
-                        if end_index >= len(d1):
-                            all_done = True
-                            break
-                    if all_done: break
-                    this_end_time = d1[end_index][1]
-                    if this_end_time < this_start_time + descent_limit:
-                        prior_descent_start = this_start_time
-                        descents.append([d0[i][0], this_start_time, d1[end_index][0], this_end_time])
-                if all_done: break
-
-
-            end_index = 0     # index into r1
-            for i in range(len(r0)):
-                all_done = False
-                this_start_time = r0[i][1]
-                if this_start_time > prior_rest_start:
-                    while r1[end_index][1] <= this_start_time: 
-                        end_index += 1
-                        if end_index >= len(r1):
-                            all_done = True
-                            break
-                    if all_done: break
-                    this_end_time = r1[end_index][1]
-                    if this_end_time < this_start_time + rest_limit:
-                        prior_rest_start = this_start_time
-                        rests.append([r0[i][0], this_start_time, r1[end_index][0], this_end_time])
-                if all_done: break
-
-            print("found", len(ascents), 'good ascents')
-            print("found", len(descents), 'good descents')
-            print("found", len(rests), 'good rests')
-
-            # profiles[] will be a list of clean ascend/descend/rest sequences, 12 numbers per sequence
-            #   ascend start:  index, timestamp        
-            #   ascend end:    index, timestamp      The 'index' refers to the source dataset, typically at "1Min"
-            #   descend start: index, timestamp      sampling rate. Note that ascend end = descend start and so on.
-            #   descend end:   index, timestamp
-            #   rest start:    index, timestamp
-            #   rest end:      index, timestamp
-            profiles           = []
-            descent_index      = 0
-            rest_index         = 0
-
-            # This code builds the profiles[] list
-            all_done = False
-            for i in range(len(ascents)):
-                all_done = False
-                this_end_ascent_time = ascents[i][3]
-                found_matching_descent = False
-                while descents[descent_index][1] < this_end_ascent_time:
-                    descent_index += 1
-                    if descent_index >= len(descents):
-                        all_done = True
-                        break
-                if all_done: break
-                if descents[descent_index][1] == ascents[i][3]:
-                    this_end_descent_time = descents[descent_index][3]
-                    while rests[rest_index][1] < this_end_descent_time:
-                        rest_index += 1
-                        if rest_index >= len(rests):
-                            all_done = True
-                            break
-                    if all_done: break
-                    if rests[rest_index][1] == descents[descent_index][3]:
-                        di = descent_index
-                        ri = rest_index
-                        profiles.append([\
-                                         ascents[i][0],   ascents[i][1],   ascents[i][2],   ascents[i][3],   \
-                                         descents[di][0], descents[di][1], descents[di][2], descents[di][3], \
-                                         rests[ri][0],    rests[ri][1],    rests[ri][2],    rests[ri][3]     \
-                                        ])
-
-
-            # This code removes profiles whose start time is earlier than the prior profile rest end time
-            #   This happens when multiple ascend starts are detected for a single actual ascent. It can
-            #   result in more than nine profiles per day which is in general unlikely. 
-            nTimeSlipsRemoved = 0
-            while True: 
-                fall_out = True
-                for i in range(1, len(profiles)):
-                    if profiles[i][1] < profiles[i-1][11]:
-                        profiles.remove(profiles[i])
-                        nTimeSlipsRemoved += 1
-                        fall_out = False
-                        break
-                if fall_out: break
-
-            # This code looks for and reports on duplicated profile ascent start times
-            double_check, fail_index = True, -1
-            for i in range(len(profiles)-1):
-                if profiles[i][1] == profiles[i+1][1]: 
-                    double_check = False
-                    fail_index = i
-                    break
-
-            if not double_check: PrintProfileEntry(profiles[fail_index])
-            else: print('no doubling of profile ascent starts found')
-
-            # This code looks for and reports on non-matching Timestamp sequences:
-            #   From ascent to descent and descent to rest.
-            double_check, fail_index = True, -1
-            for i in range(len(profiles)):
-                if profiles[i][3] != profiles[i][5] or profiles[i][7] != profiles[i][9]: 
-                    double_check = False
-                    fail_index = i
-                    break
-
-            # This code compiles a histogram of profiles by doy and it has three faults to be aware of
-            #   - Baked in is the assumption that this is at most one year of data
-            #   - There is capacity for a leap year with 366 days but it is not explicitly sorted out
-            #   - Day of year (doy) usually numbers from 1 but the histogram numbers 
-            profile_histogram = [0]*366
-            doylist = list(range(366))
-            for i in range(len(profiles)):
-                profile_histogram[doy(profiles[i][1])-1] += 1
-
-            # This code counts how many days had nine profiles as expected, and how many had more
-            #   than nine profiles which is not really possible. So that would indicate false
-            #   positives still got through the process here.
-            nNines = 0
-            nMoreThanNine = 0
-            more_than_nine = []
-            for i in range(366):
-                if profile_histogram[i] == 9: nNines = nNines + 1
-                if profile_histogram[i] > 9:  more_than_nine.append(i)
-
-
-            # print diagnostics from all of the above steps
-            print("arrived at", len(profiles), 'good candidate profiles')
-            print("after removing", nTimeSlipsRemoved, 'due to time slip error')
-            if double_check: print('transitions are self-consistent')
-            else: print('double check failed at element', fail_index)
-            print('of 365 days,', nNines, 'have nine profiles as desired')
-            print('...and', len(more_than_nine), 'had more than nine profiles')
-
-            # If days were found with more than nine profiles: Print some diagnostics
-            if len(more_than_nine):
-                for i in range(len(more_than_nine)):
-                    this_doy = more_than_nine[i] + 1     # convert from Python index to doy 1, 2, 3...
-                    print("doy", this_doy, "had more than nine profiles")
-                    # print()
-                    # print('doy is', this_doy)
-                    # print('-------------------')
-                    # for j in range(len(profiles)):
-                    #     if doy(profiles[j][1]) == this_doy:
-                    #         PrintProfileEntry(profiles[j])
-                    #         print()
-
-            df = pd.DataFrame(data=np.array([np.array(x) for x in profiles]))
-            df.to_csv(os.getcwd() + '/../Profiles/' + site + yrstr + '.csv')
-
-                
-                
+    Run ProfileSiteYear() for many (sourcefnm, site, year) jobs in a pool of worker processes 
+    (default: one per core). Each worker opens the source file itself and reads only its year.
+    Example, regenerating pre_2022_profiles: 
+      jobs = [(sources[s], s, yr) for s in ['axb', 'oos', 'osb'] for yr in range(2015, 2022)]
+      report = ProfileBatch(jobs, '../profiles/pre_2022_profiles')
+    Returns a DataFrame of diagnostics with one row per job (the per-day histograms are in 
+    the 'histogram' column).
+    """
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(ProfileSiteYear, f, site, yr, outdir, pname, False) for f, site, yr in jobs]
+        results = [future.result() for future in futures]
+    return pd.DataFrame(results)
+
+
+
 def ReadProfiles(fnm):
     """
     Profiles are saved by site and year as tuples. Here we read only
@@ -0,0 +1,276 @@
+##################
+#
+# Profile catalog: fast, cached access to the shallow profiler metadata CSV files
+#
+# Parsing the profile CSVs (../profiles/*.csv, ../profiles/pre_2022_profiles/*.csv) with pandas
+#   datetime inference is the slow part of loading profile metadata. Here both CSV layouts are
+#   read by one fixed-format parser; the six phase times (and depths, if present) are parsed
+#   once into int64 nanosecond arrays and saved to a small binary sidecar (.npz) in a .cache
+#   folder next to the CSV. The sidecar records the source path, size and modification time;
+#   if any of these change the CSV is re-parsed and the sidecar rewritten.
+#
+##################
+
+import os, re, glob
+from os.path import join as joindir
+import numpy as np, pandas as pd
+from numpy import datetime64 as dt64, timedelta64 as td64
+
+from profileindex import ProfileIndex, DailyProfileCounts, ProfileDurations, DurationRollups
+
+
+profile_time_columns = ['ascent_start', 'ascent_end', 'descent_start', 'descent_end', 'rest_start', 'rest_end']
+cache_folder         = '.cache'
+cache_version        = 2
+
+
+# The two profile CSV layouts, told apart by the number of header fields (including the
+#   leading unnamed row-label column). Values are field positions of each event's time and,
+#   for the newer layout, depth.
+#   pairs:   a0 a1 d0 d1 r0 r1 as (index, time)          e.g. osb2021.csv, pre_2022_profiles/
+#   triples: r0 r1 a0 a1 d0 d1 as (index, time, depth)   e.g. osb_profiles_jan22.csv
+profile_layouts = {
+    13: ('pairs',   {'ascent_start': 2,  'ascent_end': 4,  'descent_start': 6,  'descent_end': 8,  'rest_start': 10, 'rest_end': 12}),
+    19: ('triples', {'rest_start':   2,  'rest_end':   5,  'ascent_start':  8,  'ascent_end':  11, 'descent_start': 14, 'descent_end': 17}),
+}
+
+
+def ParseTimestamps(buf, starts, ends):
+    '''
+    Fixed-format 'YYYY-MM-DD HH:MM:SS' fields of the byte buffer buf (uint8) at the given field
+    start/end positions to int64 nanoseconds. Digits are read straight out of the buffer and
+    converted with integer arithmetic (proleptic Gregorian days-from-civil); fields that are not
+    19 characters long are NaT.
+    '''
+    d = np.lib.stride_tricks.sliding_window_view(buf, 19)[starts].astype(np.int32) - 48
+    Y   = d[..., 0]*1000 + d[..., 1]*100 + d[..., 2]*10 + d[..., 3]
+    M   = d[..., 5]*10 + d[..., 6]
+    D   = d[..., 8]*10 + d[..., 9]
+    y   = Y - (M <= 2)
+    era = y // 400
+    yoe = y - era*400
+    days = (era*146097 + yoe*365 + yoe//4 - yoe//100 + (153*((M + 9) % 12) + 2)//5 + D - 1 - 719468).astype(np.int64)
+    secs = (d[..., 11]*10 + d[..., 12])*3600 + (d[..., 14]*10 + d[..., 15])*60 + d[..., 17]*10 + d[..., 18]
+    ns   = (days*86400 + secs)*1_000_000_000
+    ns[ends - starts != 19] = np.iinfo(np.int64).min
+    return ns
+
+
+def ParseProfileFile(fnm):
+    '''
+    Read either profile CSV layout; the layout is detected from the header. Returns a dict of
+    int64 nanosecond arrays keyed by profile_time_columns and, for the (index, time, depth)
+    layout, float32 depth arrays keyed by the same names plus '_z' (e.g. 'ascent_start_z').
+    Rather than have pandas infer the datetime format of each column, field boundaries are
+    located once in the raw bytes and the fixed-format timestamps are decoded in place.
+    '''
+    with open(fnm, 'rb') as f: header, body = f.readline(), f.read()
+    nfields = header.count(b',') + 1
+    if nfields not in profile_layouts: 
+        raise ValueError(fnm + ': unrecognized profile CSV layout with ' + str(nfields) + ' columns')
+    layout, time_fields = profile_layouts[nfields]
+
+    body = body.replace(b'\r', b'')
+    if len(body) and not body.endswith(b'\n'): body += b'\n'
+    buf    = np.frombuffer(body + b' '*19, np.uint8)             # padding keeps 19-byte windows in range
+    delim  = np.flatnonzero((buf == 44) | (buf == 10))
+    starts = np.concatenate(([0], delim[:-1] + 1)).reshape(-1, nfields)
+    ends   = delim.reshape(-1, nfields)
+
+    keys   = list(time_fields)
+    fields = np.array([time_fields[k] for k in keys])
+    ns     = ParseTimestamps(buf, starts[:, fields], ends[:, fields])
+    result = {k: np.ascontiguousarray(ns[:, i]) for i, k in enumerate(keys)}
+
+    if layout == 'triples':
+        for k in keys:
+            z = [body[s:e] or b'nan' for s, e in zip(starts[:, time_fields[k] + 1], ends[:, time_fields[k] + 1])]
+            result[k + '_z'] = np.array(z, dtype=bytes).astype(np.float32)
+
+    return {k: result[k] for k in profile_time_columns + [c + '_z' for c in profile_time_columns] if k in result}
+
+
+def CacheFnm(fnm):
+    '''Sidecar file name for a profile CSV: <csv folder>/.cache/<csv name>.npz'''
+    folder, name = os.path.split(os.path.abspath(fnm))
+    return joindir(folder, cache_folder, os.path.splitext(name)[0] + '.npz')
+
+
+def ReadProfileTimes(fnm, use_cache=True):
+    '''
+    Return the six profile phase time columns of fnm as int64 nanosecond arrays (dict keyed by
+    profile_time_columns), plus float32 depths when the file has them; see ParseProfileFile().
+    Uses the binary sidecar when it matches the CSV's path, size and modification time;
+    otherwise parses the CSV and (re)writes the sidecar. A folder that is not writable simply
+    means no caching.
+    '''
+    if not use_cache: return ParseProfileFile(fnm)
+
+    source, st, cfnm = os.path.abspath(fnm), os.stat(fnm), CacheFnm(fnm)
+    if os.path.exists(cfnm):
+        try:
+            with np.load(cfnm) as z:
+                if str(z['source']) == source and int(z['size']) == st.st_size and \
+                   int(z['mtime_ns']) == st.st_mtime_ns and int(z['version']) == cache_version:
+                    return {k: z[k] for k in z.files if k not in ('source', 'size', 'mtime_ns', 'version')}
+        except (OSError, ValueError, KeyError): pass
+
+    times = ParseProfileFile(fnm)
+    try:
+        os.makedirs(os.path.dirname(cfnm), exist_ok=True)
+        with open(cfnm + '.tmp', 'wb') as f:
+            np.savez(f, source=source, size=st.st_size, mtime_ns=st.st_mtime_ns, version=cache_version, **times)
+        os.replace(cfnm + '.tmp', cfnm)
+    except OSError: pass
+    return times
+
+
+def ReadProfileMetadataCached(fnm):
+    '''Same DataFrame as ReadProfileMetadata(fnm) (ascent_start ... rest_end) built from the cached arrays'''
+    times = ReadProfileTimes(fnm)
+    return pd.DataFrame({k: times[k].view('datetime64[ns]') for k in profile_time_columns})
+
+
+
+##################
+#
+# Multi-site, multi-year catalog
+#
+# Profile files are named by site and year, e.g. pre_2022_profiles/axb2017.csv, or by site and
+#   month, e.g. osb_profiles_jan22.csv. ProfileCatalog finds all of them under the profiles
+#   folder but reads a file only when a query first needs it; after that its arrays are held
+#   in memory and reused.
+#
+##################
+
+site_year_pattern  = re.compile(r'^(?P<site>[a-z]{3})(?P<year>\d{4})\.csv$')
+site_month_pattern = re.compile(r'^(?P<site>[a-z]{3})_profiles_(?P<month>[a-z]{3})(?P<yy>\d{2})\.csv$')
+month_names        = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+
+def FileTimeSpan(fnm):
+    '''(site, t0, t1) nominal coverage of a profile file from its name; None if the name does not fit'''
+    name = os.path.basename(fnm)
+    m = site_year_pattern.match(name)
+    if m: 
+        t0 = dt64(m.group('year') + '-01', 'M')
+        return m.group('site'), dt64(t0, 'ns'), dt64(t0 + td64(12, 'M'), 'ns')
+    m = site_month_pattern.match(name)
+    if m and m.group('month') in month_names:
+        t0 = dt64('20' + m.group('yy') + '-01', 'M') + td64(month_names.index(m.group('month')), 'M')
+        return m.group('site'), dt64(t0, 'ns'), dt64(t0 + td64(1, 'M'), 'ns')
+    return None
+
+
+class ProfileCatalog:
+    '''
+    All profile metadata files (either CSV layout) for all sites, loaded lazily. Example:
+        catalog = ProfileCatalog()
+        catalog.Sites()                                                  ['axb', 'oos', 'osb']
+        p  = catalog.DataFrame('osb', dt64('2019-06-01'), dt64('2020-06-01'))
+        pi = catalog.Index('axb', dt64('2016-01-01'), dt64('2018-01-01'))
+    A query returns the profiles whose ascent start is in [t0, t1). Only the site-year files
+    that overlap the query are read. Parts() gives one dict of arrays per site-year file, each
+    a view into that file's loaded arrays, so nothing is copied. Times(), Index() and
+    DataFrame() need one contiguous array per column: when one file covers the query these
+    are views too, but a query across years is joined with a single concatenate, which copies
+    the profiles of the query (not the whole files) once.
+    The same site-year found twice (osb2021.csv is in both profiles and pre_2022_profiles)
+    is read from the first location in sorted path order.
+    '''
+
+    def __init__(self, folder=None):
+        self.folder = folder if folder is not None else os.getcwd() + '/../profiles'
+        self.files  = {}               # site: list of (t0, t1, fnm) sorted by t0
+        self.loaded = {}               # fnm: dict of int64 arrays from ReadProfileTimes()
+        found = {}
+        for fnm in sorted(glob.glob(joindir(self.folder, '**', '*.csv'), recursive=True)):
+            key = FileTimeSpan(fnm)
+            if key is not None and key not in found: found[key] = fnm
+        for (site, t0, t1), fnm in sorted(found.items()):
+            self.files.setdefault(site, []).append((t0, t1, fnm))
+
+    def Sites(self): return sorted(self.files)
+
+    def Files(self, site, t0=None, t1=None):
+        '''File names for a site whose nominal time span overlaps [t0, t1)'''
+        t0 = dt64('1900-01-01', 'ns') if t0 is None else dt64(t0, 'ns')
+        t1 = dt64('2200-01-01', 'ns') if t1 is None else dt64(t1, 'ns')
+        return [fnm for (f0, f1, fnm) in self.files.get(site, []) if f0 < t1 and f1 > t0]
+
+    def Load(self, fnm):
+        if fnm not in self.loaded: self.loaded[fnm] = ReadProfileTimes(fnm)
+        return self.loaded[fnm]
+
+    def Parts(self, site, t0=None, t1=None):
+        '''
+        List of dicts of int64 ns arrays, one per site-year file, for profiles starting in [t0, t1).
+        Each array is a view into the file's loaded arrays. A profile straddling New Year that
+        appears at the end of one file and the start of the next is kept in the earlier part.
+        '''
+        parts, last = [], None
+        for fnm in self.Files(site, t0, t1):
+            times = self.Load(fnm)
+            a0 = times['ascent_start']
+            i0 = 0       if t0 is None else np.searchsorted(a0, dt64(t0, 'ns').astype('int64'), side='left')
+            i1 = len(a0) if t1 is None else np.searchsorted(a0, dt64(t1, 'ns').astype('int64'), side='left')
+            if last is not None: i0 = max(i0, np.searchsorted(a0, last, side='right'))
+            if i1 <= i0: continue
+            parts.append({k: v[i0:i1] for k, v in times.items()})
+            last = a0[i1 - 1]
+        return parts
+
+    def Times(self, site, t0=None, t1=None):
+        '''
+        Dict of int64 ns arrays (keys profile_time_columns, plus depths) for profiles starting
+        in [t0, t1): views when one file covers the query, else one concatenate of Parts()
+        '''
+        parts = self.Parts(site, t0, t1)
+        if not parts: return {k: np.zeros(0, dtype=np.int64) for k in profile_time_columns}
+        if len(parts) == 1: return parts[0]
+        # depth columns are kept only if every file has them
+        return {k: np.concatenate([q[k] for q in parts]) for k in parts[0] if all(k in q for q in parts)}
+
+    def Index(self, site, t0=None, t1=None):
+        '''ProfileIndex over the profiles of one site starting in [t0, t1)'''
+        times = self.Times(site, t0, t1)
+        return ProfileIndex(*[times[k] for k in profile_time_columns])
+
+    def DataFrame(self, site, t0=None, t1=None):
+        '''ReadProfileMetadata()-style DataFrame for the profiles of one site starting in [t0, t1)'''
+        times = self.Times(site, t0, t1)
+        return pd.DataFrame({k: times[k].view('datetime64[ns]') for k in profile_time_columns})
+
+    def YearIndex(self, site, t0=None, t1=None):
+        '''
+        ProfileIndex over the whole calendar years of one site that overlap [t0, t1); only those
+        years' files are read. Noon and midnight windows are found per site and year, so this
+        is all ClassifyProfiles() needs for a query over [t0, t1).
+        '''
+        y0 = None if t0 is None else dt64(dt64(t0, 'ns'), 'Y')
+        y1 = None if t1 is None else dt64(dt64(t1, 'ns') - td64(1, 'ns'), 'Y') + td64(1, 'Y')
+        return self.Index(site, y0, y1)
+
+    def DailyCounts(self, site, t0=None, t1=None):
+        '''profileindex.DailyProfileCounts() of one site's profiles starting in [t0, t1); see YearIndex()'''
+        return DailyProfileCounts(self.YearIndex(site, t0, t1), t0, t1)
+
+    def OperatingStatus(self, t0=None, t1=None, sites=None):
+        '''Daily profile counts (total, standard, midnight, noon, irregular) of every site, indexed by (site, day)'''
+        sites = self.Sites() if sites is None else sites
+        return pd.concat([self.DailyCounts(s, t0, t1) for s in sites], keys=sites, names=['site'])
+
+    def PhaseStatistics(self, period='M', t0=None, t1=None, sites=None):
+        '''
+        profileindex.DurationRollups() of every site's profiles starting in [t0, t1): phase
+        duration count, mean, std and percentiles (minutes) per day ('D'), week ('W') or month
+        ('M'), indexed by (site, period).
+        '''
+        sites, tables = self.Sites() if sites is None else sites, []
+        for s in sites:
+            durations = ProfileDurations(self.YearIndex(s, t0, t1))     # classes as in DailyCounts()
+            keep = durations['time'].notna()
+            if t0 is not None: keep &= durations['time'] >= dt64(t0, 'ns')
+            if t1 is not None: keep &= durations['time'] <  dt64(t1, 'ns')
+            tables.append(DurationRollups(durations[keep], period))
+        return pd.concat(tables, keys=sites, names=['site'])
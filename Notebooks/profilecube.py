@@ -0,0 +1,295 @@
+##################
+#
+# Profile cube: sensor data binned to depth, one row per profile
+#
+# A chart or climatology of many profiles otherwise re-extracts each ragged profile with
+#   .sel(time=slice(...)). Here every sample is labelled with its profile and phase in one
+#   searchsorted (ProfileIndex.Locate()), given a depth bin, and summed into a dense
+#   (profile, depth) array with np.bincount: one pass over the time axis per sensor.
+#
+##################
+
+import os
+import numpy as np, pandas as pd, xarray as xr
+from numpy import datetime64 as dt64, timedelta64 as td64
+
+from profileindex import ProfileIndex, phase_names
+
+
+depth_edges = np.arange(-200., 1., 1.)          # default bins: 1 m from -200 to 0
+
+
+def CubeBins(t, z, p, leg='ascent', edges=None):
+    '''
+    Flat bin number profile*nbins + depth bin of every sample at times t (datetime64) and
+    depths z; -1 for samples outside leg ('ascent', 'descent' or 'rest') of every profile of
+    p (a ProfileIndex), outside the depth edges or with NaN depth. Returns the bin numbers and
+    the number of depth bins.
+    '''
+    edges = depth_edges if edges is None else np.asarray(edges)
+    nbins = len(edges) - 1
+    pid, phase = p.Locate(t)
+    depth = np.searchsorted(edges, z, side='right') - 1
+    depth[z == edges[-1]] = nbins - 1                  # the top edge belongs to the top bin
+    keep = (phase == phase_names.index(leg)) & (depth >= 0) & (depth < nbins)
+    return np.where(keep, pid*nbins + depth, -1), nbins
+
+
+def ProfileCube(da, z, p, leg='ascent', edges=None, bins=None):
+    '''
+    Bin sensor DataArray da (time dimension) at depths z (DataArray or array, e.g. ds.z) onto
+    a depth grid for every profile: leg 'ascent', 'descent' or 'rest'; p is a ProfileIndex or
+    ReadProfileMetadata() DataFrame; edges are the bin edges in m (default depth_edges, 1 m bins
+    from -200 to 0). Returns a Dataset of dims (profile, depth):
+      <da.name>   float32 bin mean, NaN where a bin has no samples
+      count       int32 number of samples in each bin
+    with coordinates profile (row of the profile metadata), time (start of the leg) and depth
+    (bin centre). Pass bins from CubeBins() to reuse them across sensors sharing a time axis.
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    edges = depth_edges if edges is None else np.asarray(edges)
+    if bins is None: bins, nbins = CubeBins(da['time'].values, np.asarray(z), p, leg, edges)
+    else: nbins = len(edges) - 1
+    size  = len(p)*nbins
+
+    v     = np.asarray(da.values, dtype=np.float64)
+    use   = (bins >= 0) & np.isfinite(v)
+    sums  = np.bincount(bins[use], weights=v[use], minlength=size)
+    count = np.bincount(bins[use], minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'): mean = (sums / count).astype(np.float32)
+
+    name  = da.name if da.name is not None else 'value'
+    start = p.Bounds(leg)[0].view('datetime64[ns]')
+    return xr.Dataset({name:    (('profile', 'depth'), mean.reshape(len(p), nbins), da.attrs),
+                       'count': (('profile', 'depth'), count.reshape(len(p), nbins).astype(np.int32))},
+                      coords={'profile': np.arange(len(p)), 'time': ('profile', start),
+                              'depth': 0.5*(edges[:-1] + edges[1:])}, attrs={'leg': leg})
+
+
+def SensorCubes(ds, p, leg='ascent', edges=None, zname='z'):
+    '''
+    ProfileCube() of every data variable of a sensor Dataset (e.g. one opened from
+    shallowprofiler.DataFnm()) against its depth variable zname; the bins are found once. The
+    counts of variable v are named v + '_count'.
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    bins, _ = CubeBins(ds['time'].values, ds[zname].values, p, leg, edges)
+    cubes = []
+    for v in ds.data_vars:
+        if v == zname or ds[v].dims != ('time',): continue
+        cubes.append(ProfileCube(ds[v], ds[zname], p, leg, edges, bins).rename({'count': v + '_count'}))
+    return xr.merge(cubes, compat='override', combine_attrs='override')
+
+
+
+##################
+#
+# Cube archive: one append-only file per site, sensor and leg
+#
+# Each archive file holds the cube rows of every profile binned so far, in profile start time
+#   order, along an unlimited profile dimension (NetCDF-4). A new month block of sensor files
+#   (e.g. ../data/osb_*_jan22_*.nc) adds rows only for profiles that start after the last
+#   stored one; earlier rows are never rewritten. A time range query is then one contiguous
+#   read of rows [i0, i1).
+#
+##################
+
+cube_chunk = 64                 # profiles per chunk in an archive file
+
+
+def CubeFnm(site, instrument, sensor, leg='ascent', folder=None):
+    '''Archive file name, e.g. ../data/cubes/osb_ctd_temperature_ascent_cube.nc'''
+    if folder is None: folder = os.getcwd() + '/../data/cubes'
+    return os.path.join(folder, '_'.join([site, instrument, sensor, leg, 'cube']) + '.nc')
+
+
+def ArchiveEnd(fnm):
+    '''Start time (int64 ns) of the last profile in an archive file; None if there is no file yet'''
+    if not os.path.exists(fnm): return None
+    import netCDF4
+    with netCDF4.Dataset(fnm) as nc:
+        n = len(nc.dimensions['profile'])
+        return int(nc.variables['time'][n - 1]) if n else None
+
+
+def AppendCube(fnm, cube):
+    '''
+    Append the profiles of cube (a ProfileCube() result) that start after the last profile of
+    archive file fnm, creating the file if need be. Profiles with no samples are skipped.
+    Returns the number of profiles appended.
+    '''
+    import netCDF4
+    name  = [v for v in cube.data_vars if v != 'count'][0]
+    t     = cube['time'].values.astype('datetime64[ns]').view('int64')
+    keep  = (cube['count'].values.sum(axis=1) > 0) & (t != np.iinfo(np.int64).min)
+    last  = ArchiveEnd(fnm)
+    if last is not None: keep &= t > last
+    rows  = np.flatnonzero(keep)
+    rows  = rows[np.argsort(t[rows], kind='stable')]
+    if not len(rows): return 0
+
+    depth = cube['depth'].values
+    if last is None:
+        os.makedirs(os.path.dirname(os.path.abspath(fnm)), exist_ok=True)
+        with netCDF4.Dataset(fnm + '.tmp', 'w', format='NETCDF4') as nc:
+            nc.createDimension('profile', None)
+            nc.createDimension('depth', len(depth))
+            nc.setncatts({'leg': cube.attrs.get('leg', ''), 'sensor': name})
+            nc.createVariable('depth', 'f8', ('depth',))[:] = depth
+            tv = nc.createVariable('time', 'i8', ('profile',), chunksizes=(1024,))
+            tv.units, tv.calendar = 'nanoseconds since 1970-01-01', 'proleptic_gregorian'
+            nc.createVariable('profile_row', 'i8', ('profile',), chunksizes=(1024,))
+            v = nc.createVariable(name, 'f4', ('profile', 'depth'), zlib=True, shuffle=True, 
+                                  chunksizes=(cube_chunk, len(depth)), fill_value=np.float32(np.nan))
+            v.setncatts({k: a for k, a in cube[name].attrs.items() if not k.startswith('_')})
+            nc.createVariable('count', 'i4', ('profile', 'depth'), zlib=True, shuffle=True, 
+                              chunksizes=(cube_chunk, len(depth)))
+        os.replace(fnm + '.tmp', fnm)
+
+    with netCDF4.Dataset(fnm, 'a') as nc:
+        if not np.array_equal(nc.variables['depth'][:], depth): raise ValueError(fnm + ': depth bins differ from the archive')
+        n0 = len(nc.dimensions['profile'])
+        n1 = n0 + len(rows)
+        nc.variables['time'][n0:n1]        = t[rows]
+        nc.variables['profile_row'][n0:n1] = cube['profile'].values[rows]
+        nc.variables[name][n0:n1, :]       = cube[name].values[rows]
+        nc.variables['count'][n0:n1, :]    = cube['count'].values[rows]
+    return len(rows)
+
+
+def TailFnm(fnm):
+    """Samples held back for profiles still open at the end of the last block: <archive>_tail.nc"""
+    return fnm[:-3] + '_tail.nc'
+
+
+def ArchiveMonthBlock(site, time, p, leg='ascent', data_folder=None, archive_folder=None, edges=None):
+    '''
+    Add one block of per-sensor files (site and time as in shallowprofiler.DataFnm(), e.g.
+    'osb', 'jan22') to the site's cube archive: for every sensor variable, bin the profiles of
+    p (ProfileIndex or DataFrame) that start after the archive's last profile and append them.
+    A profile whose leg runs past the end of the block is not appended; its samples so far are
+    kept in TailFnm() and binned with the next block, so every row holds its whole leg.
+    Returns {archive file name: profiles appended}.
+    '''
+    from sitestore import SensorFiles
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    (leg_start, leg_end), appended = p.Bounds(leg), {}
+    for (instrument, sensor), fnm in SensorFiles(site, time, data_folder).items():
+        with xr.open_dataset(fnm) as ds:
+            for v in ds.data_vars:
+                if v == 'z' or ds[v].dims != ('time',): continue
+                afnm = CubeFnm(site, instrument, v, leg, archive_folder)
+                tfnm = TailFnm(afnm)
+                last = ArchiveEnd(afnm)
+                part = ds[[v, 'z']].load()
+                if os.path.exists(tfnm):
+                    tail = xr.load_dataset(tfnm)
+                    part = xr.concat([tail.isel(time=tail['time'].values < part['time'].values[0]), part], 'time')
+                t = part['time'].values.astype('datetime64[ns]').view('int64')
+                if last is not None:
+                    # only samples from the first new profile on need binning
+                    new  = leg_start > last
+                    i0   = np.searchsorted(t, leg_start[new].min()) if new.any() else len(t)
+                    part, t = part.isel(time=slice(i0, None)), t[i0:]
+                if not len(t): appended[afnm] = 0; continue
+                cube = ProfileCube(part[v], part['z'], p, leg, edges)
+                open_ = leg_end > t[-1]
+                cube['count'].values[open_] = 0                  # profiles still open at the end of the block wait for the next
+                appended[afnm] = AppendCube(afnm, cube)
+
+                # keep the samples of open profiles that have started for the next block
+                end     = ArchiveEnd(afnm)
+                pending = open_ & (leg_start <= t[-1]) & (leg_start != np.iinfo(np.int64).min)
+                if end is not None: pending &= leg_start > end
+                if pending.any():
+                    os.makedirs(os.path.dirname(os.path.abspath(tfnm)), exist_ok=True)
+                    part.isel(time=slice(np.searchsorted(t, leg_start[pending].min()), None)).to_netcdf(tfnm + '.tmp')
+                    os.replace(tfnm + '.tmp', tfnm)
+                elif os.path.exists(tfnm): os.remove(tfnm)
+    return appended
+
+
+def ReadCube(fnm, t0=None, t1=None):
+    '''
+    Profiles of archive file fnm that start in [t0, t1) as a Dataset like ProfileCube()'s
+    (coordinate profile_row in place of profile); one contiguous read. Example, noon
+    temperature profiles: ReadCube(CubeFnm('osb', 'ctd', 'temperature'), '2015', '2023')
+    followed by a selection on the time coordinate.
+    '''
+    ds = xr.open_dataset(fnm)
+    t  = ds['time'].values
+    i0 = 0      if t0 is None else np.searchsorted(t, dt64(t0, 'ns'), side='left')
+    i1 = len(t) if t1 is None else np.searchsorted(t, dt64(t1, 'ns'), side='left')
+    cube = ds.isel(profile=slice(i0, i1)).load()
+    ds.close()
+    return cube.set_coords(['time', 'profile_row'])
+
+
+
+##################
+#
+# Ascent - descent hysteresis
+#
+# Sensor lag and hysteresis show as a difference between the ascent and the following descent
+#   of one profile at the same depth. Both legs of every profile are interpolated in depth onto
+#   one grid and the difference is summarized per profile and sensor in a tidy table, so a
+#   year of profiles can be screened at once (compare NotebookModule.CompareAscentDescent()).
+#
+##################
+
+def LegProfiles(da, z, p, leg, grid, rows=None):
+    '''
+    Sensor DataArray da at depths z for leg of the profiles rows of p (ProfileIndex; default all),
+    linearly interpolated in depth onto grid: a (len(rows), len(grid)) float64 array, NaN outside
+    the depth range a leg sampled and for legs with fewer than two samples. Samples are found with
+    one Locate() and one sort; only the interpolation runs per profile.
+    '''
+    rows = np.arange(len(p)) if rows is None else np.asarray(rows)
+    pid, phase = p.Locate(da['time'].values)
+    v, zv = np.asarray(da.values, dtype=np.float64), np.asarray(z, dtype=np.float64)
+    use   = (phase == phase_names.index(leg)) & np.isin(pid, rows) & np.isfinite(v) & np.isfinite(zv)
+    pid, v, zv = pid[use], v[use], zv[use]
+    order = np.lexsort((zv, pid))
+    pid, v, zv = pid[order], v[order], zv[order]
+    bounds = np.searchsorted(pid, rows, side='left'), np.searchsorted(pid, rows, side='right')
+
+    out = np.full((len(rows), len(grid)), np.nan)
+    for k, (i0, i1) in enumerate(zip(*bounds)):
+        if i1 - i0 < 2: continue
+        inside = (grid >= zv[i0]) & (grid <= zv[i1 - 1])
+        out[k, inside] = np.interp(grid[inside], zv[i0:i1], v[i0:i1])
+    return out
+
+
+def Hysteresis(ds, p, t0=None, t1=None, grid=None, zname='z'):
+    '''
+    Ascent minus descent of every data variable of sensor Dataset ds (time dimension, depth
+    variable zname) for the profiles of p (ProfileIndex or DataFrame) whose ascent starts in
+    [t0, t1), both legs interpolated onto depth grid (default the depth_edges bin centres).
+    Returns a DataFrame with one row per profile and sensor: profile (row of p), time (ascent
+    start), sensor, n (grid depths both legs cover), mean, rms and max (largest absolute)
+    difference; NaN where the legs do not overlap. For a set of sensor files:
+        pd.concat([Hysteresis(xr.open_dataset(f), p, '2021-01', '2022-01') for f in fnms])
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    grid = 0.5*(depth_edges[:-1] + depth_edges[1:]) if grid is None else np.asarray(grid, dtype=np.float64)
+    a0   = p.ascent_start
+    keep = a0 != np.iinfo(np.int64).min
+    if t0 is not None: keep &= a0 >= dt64(t0, 'ns').astype(np.int64)
+    if t1 is not None: keep &= a0 <  dt64(t1, 'ns').astype(np.int64)
+    rows = np.flatnonzero(keep)
+
+    tables = []
+    for name in ds.data_vars:
+        if name == zname or ds[name].dims != ('time',): continue
+        d = LegProfiles(ds[name], ds[zname], p, 'ascent', grid, rows) - LegProfiles(ds[name], ds[zname], p, 'descent', grid, rows)
+        n = np.isfinite(d).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(d, axis=1) / n
+            rms  = np.sqrt(np.nansum(d*d, axis=1) / n)
+        big  = np.nanargmax(np.where(np.isfinite(d), np.abs(d), -1.), axis=1)
+        peak = np.where(n > 0, d[np.arange(len(rows)), big], np.nan)
+        tables.append(pd.DataFrame({'profile': rows, 'time': a0[rows].view('datetime64[ns]'), 'sensor': name, 
+                                    'n': n, 'mean': mean, 'rms': rms, 'max': peak}))
+    if not tables: return pd.DataFrame(columns=['profile', 'time', 'sensor', 'n', 'mean', 'rms', 'max'])
+    return pd.concat(tables, ignore_index=True)
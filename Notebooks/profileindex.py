@@ -0,0 +1,340 @@
+##################
+#
+# Profile index: shallow profiler metadata as contiguous int64 arrays
+#
+# The profile CSV files in ../profiles give, per row, the start and end times of the ascent,
+#   descent and rest phases of one profile. The charting code reads these into a DataFrame and
+#   looks up phase windows one profile at a time by string key. ProfileIndex holds the same
+#   timestamps as int64 nanosecond arrays and answers 'which profile and phase contains time t'
+#   for an entire sensor time axis with one binary search: O(n log m) for n samples and m profiles.
+#
+##################
+
+import numpy as np, pandas as pd, xarray as xr
+from numpy import datetime64 as dt64, timedelta64 as td64
+
+
+# phase codes returned by ProfileIndex.Locate(); NOPHASE marks samples outside every profile
+NOPHASE, REST, ASCENT, DESCENT = -1, 0, 1, 2
+phase_names = ['rest', 'ascent', 'descent']
+
+
+def AsNanoseconds(t):
+    '''Convert a datetime64 scalar/array, Timestamp, DatetimeIndex or Series to int64 nanoseconds'''
+    if isinstance(t, (pd.Series, pd.Index)): t = t.values
+    return np.asarray(t).astype('datetime64[ns]').view('int64')
+
+
+class ProfileIndex:
+    '''
+    Interval index over shallow profiler phases. Built once from profile metadata; holds
+    six contiguous int64 (nanosecond) arrays, one entry per profile (row of the profile CSV):
+    ascent_start, ascent_end, descent_start, descent_end, rest_start, rest_end.
+
+    Phase intervals are half-open [start, end) so that the shared event at ascent end /
+    descent start belongs to the descent and so on. All valid intervals are flattened and
+    sorted by start time; Locate() is then a searchsorted of the query times against the
+    interval starts followed by a check against the matching interval end. Where intervals
+    overlap (a time-slip in the source metadata) the later-starting interval wins.
+    '''
+
+    def __init__(self, ascent_start, ascent_end, descent_start, descent_end, rest_start, rest_end):
+        self.ascent_start  = np.ascontiguousarray(AsNanoseconds(ascent_start))
+        self.ascent_end    = np.ascontiguousarray(AsNanoseconds(ascent_end))
+        self.descent_start = np.ascontiguousarray(AsNanoseconds(descent_start))
+        self.descent_end   = np.ascontiguousarray(AsNanoseconds(descent_end))
+        self.rest_start    = np.ascontiguousarray(AsNanoseconds(rest_start))
+        self.rest_end      = np.ascontiguousarray(AsNanoseconds(rest_end))
+
+        # flatten to one interval table ordered by start time
+        nprofiles = len(self.ascent_start)
+        starts = np.concatenate((self.rest_start, self.ascent_start, self.descent_start))
+        ends   = np.concatenate((self.rest_end,   self.ascent_end,   self.descent_end))
+        pids   = np.tile(np.arange(nprofiles, dtype=np.int64), 3)
+        phases = np.repeat(np.array([REST, ASCENT, DESCENT], dtype=np.int8), nprofiles)
+
+        nat   = np.iinfo(np.int64).min
+        valid = (starts != nat) & (ends != nat) & (ends > starts)
+        order = np.argsort(starts[valid], kind='stable')
+        self._starts = starts[valid][order]
+        self._ends   = ends[valid][order]
+        self._pids   = pids[valid][order]
+        self._phases = phases[valid][order]
+
+    @classmethod
+    def FromDataFrame(cls, p):
+        '''Build from a ReadProfileMetadata() DataFrame (columns ascent_start ... rest_end)'''
+        return cls(p['ascent_start'], p['ascent_end'], p['descent_start'],
+                   p['descent_end'],  p['rest_start'], p['rest_end'])
+
+    @classmethod
+    def FromCSV(cls, fnm):
+        '''Build from a profile CSV of either layout, e.g. ../profiles/osb2021.csv or osb_profiles_jan22.csv'''
+        from profilecatalog import ReadProfileTimes, profile_time_columns
+        times = ReadProfileTimes(fnm)
+        return cls(*[times[k] for k in profile_time_columns])
+
+    def __len__(self): return len(self.ascent_start)
+
+    def Bounds(self, leg):
+        '''Return (start, end) int64 arrays for leg 'ascent', 'descent' or 'rest' across all profiles'''
+        return getattr(self, leg + '_start'), getattr(self, leg + '_end')
+
+    def Window(self, pidx, leg):
+        '''Return the (start, end) datetime64 pair for profile pidx and leg 'ascent', 'descent' or 'rest' '''
+        t0, t1 = self.Bounds(leg)
+        return dt64(int(t0[pidx]), 'ns'), dt64(int(t1[pidx]), 'ns')
+
+    def Locate(self, t):
+        '''
+        For an array of times t (any datetime64 resolution, or int64 ns) return two arrays of the
+        same length: the profile index (row of the profile CSV) and phase code for each time.
+        Times that fall outside every profile phase get profile index -1 and phase NOPHASE.
+        '''
+        tns = np.asarray(t) if np.asarray(t).dtype == np.int64 else AsNanoseconds(t)
+        pid, phase = np.full(tns.shape, -1, dtype=np.int64), np.full(tns.shape, NOPHASE, dtype=np.int8)
+        if not len(self._starts): return pid, phase
+        k = np.searchsorted(self._starts, tns, side='right') - 1
+        kc = np.clip(k, 0, None)
+        inside = (k >= 0) & (tns < self._ends[kc])
+        pid[inside], phase[inside] = self._pids[kc[inside]], self._phases[kc[inside]]
+        return pid, phase
+
+
+def AttachProfileCoordinates(ds, p, dim='time'):
+    '''
+    Label every sample of a sensor Dataset (or DataArray) with its profile and phase. 
+    ds is for example one of the datasets returned by ReadOSB_March2021_1min() or opened 
+    from shallowprofiler.DataFnm(); p is a ProfileIndex or a ReadProfileMetadata() DataFrame.
+    Returns ds with two new coordinates along dim:
+      profile_id   int64 row index into the profile metadata, -1 outside any profile
+      phase        int8 code REST, ASCENT or DESCENT, NOPHASE (-1) outside any profile
+    This is one searchsorted pass over the time axis. Per-profile work then becomes e.g.
+      dsp = AttachProfileCoordinates(T, p)
+      dsp.where(dsp.phase == ASCENT, drop=True).groupby('profile_id').mean()
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    pid, phase = p.Locate(ds[dim].values)
+    return ds.assign_coords(profile_id=(dim, pid), phase=(dim, phase))
+
+
+
+##################
+#
+# Profile-aligned chunking
+#
+# Opened with chunks on profile (or day) boundaries a year of 1-minute sensor data stays on
+#   disk until used, and a per-profile reduction becomes one dask task per chunk that reads
+#   exactly that chunk, in place of one .sel(time=slice(...)) after another.
+#
+##################
+
+def ProfileChunks(t, p, by='profile'):
+    '''
+    Chunk sizes along a time axis t (datetime64 array) that break at the start of every profile
+    (by='profile'; p is a ProfileIndex or ReadProfileMetadata() DataFrame) or at midnight
+    (by='day'). A profile starts at its ascent or, in the rest-first layout, its rest. Returns
+    a tuple of chunk lengths summing to len(t), for xarray's .chunk({'time': ...}).
+    '''
+    tns = AsNanoseconds(t)
+    if by == 'profile':
+        if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+        nat    = np.iinfo(np.int64).min
+        rest   = np.where(p.rest_start == nat, p.ascent_start, p.rest_start)
+        starts = np.minimum(p.ascent_start, rest)
+        starts = starts[starts != nat]
+    elif by == 'day':
+        day_ns = td64(1, 'D').astype('timedelta64[ns]').astype(np.int64)
+        starts = np.unique(tns // day_ns) * day_ns
+    else: raise ValueError("by must be 'profile' or 'day'")
+    edges = np.unique(np.concatenate(([0], np.searchsorted(tns, starts), [len(tns)])))
+    return tuple(int(n) for n in np.diff(edges) if n > 0)
+
+
+def OpenProfileChunked(fnm, p, by='profile', dim='time'):
+    '''
+    Open a sensor file (e.g. shallowprofiler.DataFnm('osb', 'ctd', 'jan22', 'temperature'))
+    as dask arrays chunked along dim by ProfileChunks(), with the profile_id and phase
+    coordinates of AttachProfileCoordinates(). Nothing but the time axis is read until a
+    computation asks for it.
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    ds = xr.open_dataset(fnm)
+    ds = ds.chunk({dim: ProfileChunks(ds[dim].values, p, by)})
+    return AttachProfileCoordinates(ds, p, dim)
+
+
+def ProfileReduce(ds, func, *names, dim='time'):
+    '''
+    Apply func to every chunk of a Dataset from OpenProfileChunked() as parallel dask tasks,
+    one task per chunk. func receives the chunk's numpy values of the named variables and returns
+    a scalar or a fixed-length array. Examples:
+        ProfileReduce(ds, np.nanmean, 'temperature')                                  means
+        ProfileReduce(ds, lambda v: [np.nanmin(v), np.nanmax(v)], 'temperature')      extrema
+        ProfileReduce(ds, lambda v, z: np.histogram(z, bins, weights=v)[0], 'temperature', 'z')
+    Returns a DataArray along a 'chunk' dimension with coordinates profile_id (of the profile in
+    that chunk, -1 for samples ahead of the first profile) and time (first sample of the chunk).
+    '''
+    import dask
+    blocks  = [ds[n].data.to_delayed().ravel() for n in names]
+    results = dask.compute(*[dask.delayed(func)(*b) for b in zip(*blocks)])
+    edges   = np.concatenate(([0], np.cumsum(ds.chunks[dim])))[:-1]
+    pid     = np.maximum.reduceat(ds['profile_id'].values, edges) if 'profile_id' in ds.coords else np.full(len(edges), -1)
+    values  = np.array(results)
+    dims    = ('chunk',) + tuple('k' + str(i) for i in range(values.ndim - 1))
+    return xr.DataArray(values, dims=dims, coords={'profile_id': ('chunk', pid), 'time': ('chunk', ds[dim].values[edges])})
+
+
+
+##################
+#
+# Noon and midnight profiles
+#
+# Twice a day the profiler makes a longer descent with extra stops: the local midnight and
+#   local noon profiles. ClassifyProfiles() tells them apart for a whole catalog at once from
+#   two columns: the ascent start time of day (UTC) and the descent duration.
+#
+##################
+
+# profile classes from ClassifyProfiles(); IRREGULAR is a long descent at neither time of day
+STANDARD, MIDNIGHT, NOON, IRREGULAR = 0, 1, 2, 3
+profile_classes = ['standard', 'midnight', 'noon', 'irregular']
+
+# ascent start time of day (UTC) windows, exclusive at both ends, and the shortest long descent.
+#   These fixed windows fit Oregon Slope Base; ClassifyProfiles() by default finds each year's
+#   windows from its own long descents (LongDescentWindows()), as the sites and years differ:
+#   Axial Base runs its long descents at about 7:40 and 21:00 UTC.
+midnight_window = (td64( 7*60 + 10, 'm'), td64( 7*60 + 34, 'm'))       # 7:10 to 7:34
+noon_window     = (td64(20*60 + 30, 'm'), td64(20*60 + 54, 'm'))       # 20:30 to 20:54
+long_descent    = td64(60, 'm')
+window_width    = td64(24, 'm')
+local_midnight  = td64(7*60 + 30, 'm')         # about 0:00 Pacific time, for telling the two windows apart
+
+day_ns = td64(1, 'D').astype('timedelta64[ns]').astype(np.int64)
+
+
+def LongDescents(p):
+    '''Boolean mask of the profiles of p (a ProfileIndex) whose descent lasts at least long_descent'''
+    nat = np.iinfo(np.int64).min
+    return (p.descent_start != nat) & (p.descent_end != nat) & \
+           ((p.descent_end - p.descent_start) >= td64(long_descent, 'ns').astype(np.int64))
+
+
+def LongDescentWindows(p, width=window_width, min_count=4):
+    '''
+    (midnight window, noon window) of ascent start times of day for the profiles of p (a
+    ProfileIndex), found from its long descents: the busiest width-long window of the day, then
+    the busiest at least 6 hours from it. Each window is centred on the mean start time within
+    it; the one nearer local_midnight is the midnight window. Falls back to midnight_window and
+    noon_window when either window has fewer than min_count long descents.
+    '''
+    w    = int(width / td64(1, 'm'))
+    tod  = (p.ascent_start[LongDescents(p)] % day_ns) // 60_000_000_000
+    hist = np.bincount(tod, minlength=1440)
+    busy = np.convolve(np.concatenate((hist, hist[:w - 1])), np.ones(w, dtype=np.int64), 'valid')
+    circ = lambda d: np.minimum(d % 1440, -d % 1440)
+    centres = []
+    for _ in range(2):
+        m = int(np.argmax(busy))
+        if busy[m] < min_count: return midnight_window, noon_window
+        d = (tod - m) % 1440
+        centres.append((m + d[d < w].mean()) % 1440)
+        busy[circ(np.arange(1440) + w/2. - centres[-1]) < 360] = 0
+    centres.sort(key=lambda c: circ(c - local_midnight / td64(1, 'm')))
+    half = w/2.
+    return tuple((td64(int(round((c - half)*60)), 's'), td64(int(round((c + half)*60)), 's')) for c in centres)
+
+
+def InWindow(tod, window):
+    '''Mask of times of day tod (int64 ns) strictly inside window (lo, hi); lo may be past hi across midnight'''
+    lo, hi = (td64(x, 'ns').astype(np.int64) % day_ns for x in window)
+    return ((tod > lo) & (tod < hi)) if lo < hi else ((tod > lo) | (tod < hi))
+
+
+def ClassifyProfiles(p, windows=None):
+    '''
+    int8 class (STANDARD, MIDNIGHT, NOON or IRREGULAR) of every profile of p (a ProfileIndex
+    or ReadProfileMetadata() DataFrame). A profile whose descent lasts at least long_descent is
+    MIDNIGHT or NOON if its ascent starts inside the midnight or noon window, else IRREGULAR.
+    windows is a (midnight window, noon window) pair, e.g. (midnight_window, noon_window); by
+    default each calendar year of p gets LongDescentWindows() of its own profiles, so p should
+    hold whole years of one site (e.g. ProfileCatalog.Index(site)).
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    tod, long = p.ascent_start % day_ns, LongDescents(p)
+    classes = np.full(len(p), STANDARD, dtype=np.int8)
+    classes[long] = IRREGULAR
+    if windows is not None: years = [np.ones(len(p), dtype=bool)]
+    else:
+        year  = p.ascent_start.view('datetime64[ns]').astype('datetime64[Y]')
+        years = [year == y for y in np.unique(year[~np.isnat(year)])]
+    for rows in years:
+        midnight, noon = windows if windows is not None else LongDescentWindows(ProfileIndex(*[getattr(p, k)[rows] for k in 
+                            ('ascent_start', 'ascent_end', 'descent_start', 'descent_end', 'rest_start', 'rest_end')]))
+        classes[rows & long & InWindow(tod, midnight)] = MIDNIGHT
+        classes[rows & long & InWindow(tod, noon)]     = NOON
+    return classes
+
+
+def DailyProfileCounts(p, t0=None, t1=None, windows=None):
+    '''
+    Profile counts per day (UTC) for the profiles of p whose ascent starts in [t0, t1): a
+    DataFrame indexed by day with columns total, standard, midnight, noon and irregular.
+    Every day from t0 (default the first profile's day) up to t1 (default the last) has a row,
+    days without profiles included. Classes are from ClassifyProfiles(p, windows) over all of p.
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    a0, classes = p.ascent_start, ClassifyProfiles(p, windows)
+    keep = a0 != np.iinfo(np.int64).min
+    if t0 is not None: keep &= a0 >= AsNanoseconds(dt64(t0, 'ns'))
+    if t1 is not None: keep &= a0 <  AsNanoseconds(dt64(t1, 'ns'))
+    day  = a0[keep] // day_ns
+    d0   = AsNanoseconds(dt64(t0, 'D')) // day_ns if t0 is not None else (day.min() if len(day) else 0)
+    d1   = -(-AsNanoseconds(dt64(t1, 'ns')) // day_ns) if t1 is not None else (day.max() + 1 if len(day) else 0)
+    ndays  = int(max(d1 - d0, 0))
+    counts = np.bincount((day - d0)*len(profile_classes) + classes[keep], 
+                         minlength=ndays*len(profile_classes)).reshape(ndays, len(profile_classes))
+    days   = ((d0 + np.arange(ndays))*day_ns).view('datetime64[ns]')
+    df = pd.DataFrame(counts, index=pd.DatetimeIndex(days, name='day'), columns=profile_classes)
+    df.insert(0, 'total', counts.sum(axis=1))
+    return df
+
+
+
+##################
+#
+# Phase durations
+#
+##################
+
+duration_percentiles = [5, 50, 95]
+
+
+def ProfileDurations(p, windows=None):
+    '''
+    Ascent, descent and rest durations in minutes (NaN where a time is missing) of every
+    profile of p (ProfileIndex or DataFrame), with its ascent start time and ClassifyProfiles()
+    class name (see there for windows): a DataFrame with one row per profile.
+    '''
+    if not isinstance(p, ProfileIndex): p = ProfileIndex.FromDataFrame(p)
+    nat, minute = np.iinfo(np.int64).min, 60e9
+    durations = {'time': p.ascent_start.view('datetime64[ns]'), 
+                 'class': np.array(profile_classes)[ClassifyProfiles(p, windows)]}
+    for leg in phase_names[1:] + phase_names[:1]:
+        t0, t1 = p.Bounds(leg)
+        durations[leg] = np.where((t0 == nat) | (t1 == nat), np.nan, (t1 - t0) / minute)
+    return pd.DataFrame(durations)
+
+
+def DurationRollups(durations, period='D'):
+    '''
+    Per-period statistics of a ProfileDurations() table: period 'D' (day), 'W' (week starting
+    Monday) or 'M' (month). Returns a DataFrame indexed by period start with columns
+    (phase, statistic): count, mean, std and the duration_percentiles, e.g. ('descent', 'p95').
+    '''
+    durations = durations[durations['time'].notna()]
+    key = pd.PeriodIndex(durations['time'], freq=period).start_time.rename('period')
+    g   = durations[['ascent', 'descent', 'rest']].groupby(key)
+    stats = {'count': g.count(), 'mean': g.mean(), 'std': g.std()}
+    for q in duration_percentiles: stats['p' + str(q)] = g.quantile(q/100.)
+    return pd.concat(stats, axis=1).swaplevel(axis=1)[['ascent', 'descent', 'rest']]
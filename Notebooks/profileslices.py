@@ -0,0 +1,64 @@
+##################
+#
+# Profile slices: per-profile numpy views of sensor data
+#
+# A chart loop over profiles used to call .sel(time=slice(t0, t1)) twice per profile and per
+#   sensor. ProfileSlices finds the (start, stop) positions of every profile phase on a
+#   sensor's time axis once, with one searchsorted per phase over the ProfileIndex bounds, and
+#   then hands out numpy views. The charting code in source/ (annotation.py, Biooptics.py,
+#   biooptics_data_quality.py) uses it through ProfileSlicesFor().
+#
+##################
+
+import weakref
+import numpy as np
+
+from profileindex import ProfileIndex
+
+
+class ProfileSlices:
+    """
+    Integer (start, stop) positions of every profile phase on each sensor's time axis, found
+    once with searchsorted and then kept. Tables are keyed by the time index that xarray shares
+    between a Dataset and every DataArray taken from it, so A.chlora and A.z use one table.
+    p is a ProfileIndex or a profile metadata DataFrame. As with .sel(time=slice(t0, t1)) a
+    sample at the phase end time is included.
+        x, z = ProfileSlicesFor(p).View(pIdx, 'ascent', A.chlora, A.z)
+    """
+    legs = ['rest', 'ascent', 'descent']
+
+    def __init__(self, p):
+        self.index  = p if isinstance(p, ProfileIndex) else ProfileIndex.FromDataFrame(p)
+        self.tables = {}                           # id(time index): (weak reference to it, table)
+
+    def Table(self, da):
+        """int64 array (profile, leg, 2) of start, stop positions on the time axis of da"""
+        index = da.indexes['time']
+        entry = self.tables.get(id(index))
+        if entry is not None and entry[0]() is index: return entry[1]
+        t, nat = index.values.astype('datetime64[ns]').view('int64'), np.iinfo(np.int64).min
+        table  = np.zeros((len(self.index), len(self.legs), 2), dtype=np.int64)
+        for k, leg in enumerate(self.legs):
+            t0, t1 = self.index.Bounds(leg)
+            ok = (t0 != nat) & (t1 != nat)
+            table[ok, k, 0] = np.searchsorted(t, t0[ok], side='left')
+            table[ok, k, 1] = np.searchsorted(t, t1[ok], side='right')
+        self.tables[id(index)] = (weakref.ref(index), table)
+        return table
+
+    def View(self, pIdx, leg, *arrays):
+        """numpy views of the DataArrays arrays over profile pIdx, leg 'ascent', 'descent' or 'rest'"""
+        k, views = self.legs.index(leg), []
+        for da in arrays:
+            i0, i1 = self.Table(da)[pIdx, k]
+            views.append(da.values[i0:i1])
+        return views
+
+
+profile_slices = {}         # id(profile metadata): (weak reference to it, ProfileSlices)
+
+def ProfileSlicesFor(p):
+    """The ProfileSlices of profile metadata p (DataFrame or ProfileIndex), made on first use"""
+    entry = profile_slices.get(id(p))
+    if entry is None or entry[0]() is not p: entry = profile_slices[id(p)] = (weakref.ref(p), ProfileSlices(p))
+    return entry[1]
@@ -0,0 +1,66 @@
+##################
+#
+# Sensor bundle: the Oregon Slope Base 1-minute sensor files, opened on first use
+#
+# The notebooks name the shallow profiler sensors by one letter (A chlorophyll, T temperature
+#   and so on). The file tables below map those letters to the intra-repo source files under
+#   RepositoryData/rca; a SensorBundle opens and cleans (sensorclean.OpenClean()) one of them
+#   the first time it is asked for. NotebookModule.py and source/Biooptics.py each make their
+#   own bundle, as their data folder is relative to a different working directory.
+#
+##################
+
+from sensorclean import OpenClean, CleanSteps
+
+
+# Sensor files by the one-letter names used throughout: A chlorophyll, B backscatter, C CDOM,
+#   T temperature, S salinity, O oxygen, H pH, I spectral irradiance, N nitrate, P PAR,
+#   U V W east north up current, R pCO2
+osb_march2021_1min = {
+    'A': 'fluor/osb_chlora_march2021_1min.nc',       'B': 'fluor/osb_backscatter_march2021_1min.nc',
+    'C': 'fluor/osb_cdom_march2021_1min.nc',         'T': 'ctd/osb_temp_march2021_1min.nc',
+    'S': 'ctd/osb_salinity_march2021_1min.nc',       'O': 'ctd/osb_doxygen_march2021_1min.nc',
+    'H': 'pH/osb_ph_march2021_1min.nc',              'I': 'irrad/osb_spectir_march2021_1min.nc',
+    'N': 'nitrate/osb_nitrate_march2021_1min.nc',    'P': 'par/osb_par_march2021_1min.nc',
+    'U': 'current/osb_veast_march2021_1min.nc',      'V': 'current/osb_vnorth_march2021_1min.nc',
+    'W': 'current/osb_vup_march2021_1min.nc',        'R': 'pCO2/osb_pco2_march2021.nc'}
+
+osb_junejuly2018_1min = {
+    'A': 'fluor/osb_chlora_june_july2018_1min.nc',    'B': 'fluor/osb_backscatter_june_july2018_1min.nc',
+    'C': 'fluor/osb_cdom_june_july2018_1min.nc',      'T': 'ctd/osb_temp_june_july2018_1min.nc',
+    'S': 'ctd/osb_salinity_june_july2018_1min.nc',    'O': 'ctd/osb_doxygen_june_july2018_1min.nc',
+    'H': 'pH/osb_ph_june_july2018_1min.nc',           'I': 'irrad/osb_spectir_june_july2018_1min.nc',
+    'N': 'nitrate/osb_nitrate_june_july2018_1min.nc', 'P': 'par/osb_par_june_july2018_1min.nc',
+    'U': 'current/osb_veast_june_july2018_1min.nc',   'V': 'current/osb_vnorth_june_july2018_1min.nc',
+    'W': 'current/osb_vup_june_july2018_1min.nc'}
+
+# artifacts to discard in O, T and S
+osb_qc_agg = {
+    'O': ['moles_of_oxygen_per_unit_mass_in_sea_water_profiler_depth_enabled_qc_agg'],
+    'T': ['sea_water_temperature_profiler_depth_enabled_qc_agg'],
+    'S': ['sea_water_practical_salinity_profiler_depth_enabled_qc_agg']}
+
+
+class SensorBundle:
+    '''
+    A set of sensor datasets opened by attribute on first use: bundle.T opens the temperature
+    file cleaned by sensorclean.OpenClean() (qc_agg variables, NaN samples and repeated times
+    discarded; cached on disk after the first clean) and keeps the result; after that bundle.T
+    is the same Dataset. Only the sensors a notebook touches are read.
+      folder    data folder, ending in /
+      sources   {attribute name: file name relative to folder}
+      drop      {attribute name: list of variables to discard}
+    '''
+    def __init__(self, folder, sources, drop=None):
+        self.folder, self.sources, self.drop = folder, sources, drop if drop is not None else {}
+
+    def __getattr__(self, name):
+        sources = self.__dict__.get('sources', {})
+        if name not in sources: raise AttributeError(name)
+        ds = OpenClean(self.folder + sources[name], CleanSteps(self.drop.get(name)))
+        setattr(self, name, ds)
+        return ds
+
+    def Loaded(self):
+        '''attribute names of the datasets opened so far'''
+        return [k for k in self.sources if k in self.__dict__]
@@ -0,0 +1,97 @@
+##################
+#
+# Sensor clean: clean a raw sensor file once and keep the result
+#
+# Raw sensor NetCDF files (e.g. ../RepositoryData/rca/ctd/osb_temp_march2021_1min.nc) need the
+#   same cleaning before use: drop the *_qc_agg quality flag variables, drop samples with NaN
+#   values and keep one sample per timestamp. A cleaning is written down as a list of steps,
+#   e.g. default_clean_steps, and OpenClean() runs it once per source file. The result goes to
+#   a cache file in a .cache folder next to the source, with a provenance hash of the source
+#   path, size and modification time and of the steps. A later open whose hash matches reads
+#   the cache directly; a changed source file or changed steps means the source is cleaned again.
+#
+##################
+
+import os, re, hashlib
+from os.path import join as joindir
+import numpy as np, xarray as xr
+
+
+cache_folder  = '.cache'
+clean_version = 1
+
+
+def DropVariables(ds, names):
+    '''discard the listed variables (those present)'''
+    return ds.drop_vars(list(names), errors='ignore')
+
+def DropMatching(ds, pattern):
+    '''discard every variable whose name matches the regular expression pattern'''
+    return ds.drop_vars([v for v in ds.data_vars if re.search(pattern, v)])
+
+def DropNaN(ds, dim):
+    '''discard samples along dim that have a NaN in any variable'''
+    return ds.dropna(dim)
+
+def UniqueTime(ds, dim):
+    '''keep the first sample of each dim value, sorted by dim (as in data.ReformatDataFile())'''
+    _, keeper_index = np.unique(ds[dim].values, return_index=True)
+    if len(keeper_index) == ds.sizes[dim] and (np.diff(keeper_index) > 0).all(): return ds
+    return ds.isel({dim: keeper_index})
+
+
+# step name: function(ds, argument); a cleaning is a list of (step name, argument) pairs
+clean_steps = {'drop': DropVariables, 'drop_matching': DropMatching, 'dropna': DropNaN, 'unique': UniqueTime}
+
+default_clean_steps = [('drop_matching', '_qc_agg$'), ('dropna', 'time'), ('unique', 'time')]
+
+
+def CleanSteps(drop=None):
+    '''default_clean_steps, first discarding the variables listed in drop (e.g. osb_qc_agg['T'])'''
+    return ([('drop', list(drop))] if drop else []) + default_clean_steps
+
+
+def CleanDataset(ds, steps=None):
+    '''Apply the cleaning steps (default default_clean_steps) to ds in order'''
+    for step, arg in (default_clean_steps if steps is None else steps): ds = clean_steps[step](ds, arg)
+    return ds
+
+
+def CleanFnm(fnm):
+    '''Cache file name for a raw sensor file: <source folder>/.cache/<source name>.clean.nc'''
+    folder, name = os.path.split(os.path.abspath(fnm))
+    return joindir(folder, cache_folder, os.path.splitext(name)[0] + '.clean.nc')
+
+
+def Provenance(fnm, steps=None):
+    '''Hash of the source file's path, size and modification time, the steps and clean_version'''
+    st = os.stat(fnm)
+    steps = default_clean_steps if steps is None else steps
+    key = repr((os.path.abspath(fnm), st.st_size, st.st_mtime_ns, [(s, a) for s, a in steps], clean_version))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def OpenClean(fnm, steps=None):
+    '''
+    The cleaned Dataset of raw sensor file fnm. If the cache file (CleanFnm(fnm)) carries the
+    provenance hash of fnm and steps it is opened directly; otherwise fnm is cleaned with
+    CleanDataset() and the cache (re)written. A folder that is not writable simply means
+    no caching.
+    '''
+    provenance, cfnm = Provenance(fnm, steps), CleanFnm(fnm)
+    if os.path.exists(cfnm):
+        try:
+            ds = xr.open_dataset(cfnm)
+            if ds.attrs.get('clean_provenance') == provenance: return ds
+            ds.close()
+        except (OSError, ValueError): pass
+
+    with xr.open_dataset(fnm) as raw: ds = CleanDataset(raw, steps).load()
+    ds.attrs['clean_provenance'] = provenance
+    for v in ds.variables.values(): v.encoding = {k: e for k, e in v.encoding.items() if k in ('dtype', '_FillValue', 'units', 'calendar')}
+    try:
+        os.makedirs(os.path.dirname(cfnm), exist_ok=True)
+        ds.to_netcdf(cfnm + '.tmp')
+        os.replace(cfnm + '.tmp', cfnm)
+    except OSError: pass
+    return ds
@@ -1,4 +1,5 @@
 import os, sys, time, glob, warnings
+from collections import OrderedDict
 from os.path import join as joindir
 from IPython.display import clear_output
 from matplotlib import pyplot as plt
@@ -6,6 +7,8 @@ from matplotlib import colors as mplcolors
 import numpy as np, pandas as pd, xarray as xr
 from numpy import datetime64 as dt64, timedelta64 as td64
 
+from profilecatalog import ReadProfileTimes
+
 warnings.filterwarnings('ignore')
 
 def doy(theDatetime): return 1 + int((theDatetime - dt64(str(theDatetime)[0:4] + '-01-01')) / td64(1, 'D'))
@@ -22,16 +25,15 @@ def ReadProfileMetadata(fnm):
     degeneracy in that for a given row the Rest end is the same event as Ascent start. Likewise
     Ascent end is also Descent start. Descent end is Rest start *in the subsequent row*. The 
     exception is of course in the final row. Event depth is measured as a negative value below
-    the zero which is the sea surface.
+    the zero which is the sea surface. Depths are float32. The file is parsed (and cached) by
+    profilecatalog.ReadProfileTimes().
     """
-    df = pd.read_csv(fnm, usecols=["1","2","4","5","7","8","10","11","13","14","16","17"])
-    df.columns=['r0t','r0z','r1t','r1z','a0t','a0z','a1t','a1z','d0t','d0z','d1t','d1z']
-    df['r0t'] = pd.to_datetime(df['r0t'])
-    df['r1t'] = pd.to_datetime(df['r1t'])
-    df['a0t'] = pd.to_datetime(df['a0t'])
-    df['a1t'] = pd.to_datetime(df['a1t'])
-    df['d0t'] = pd.to_datetime(df['d0t'])
-    df['d1t'] = pd.to_datetime(df['d1t'])
+    p = ReadProfileTimes(fnm)
+    df = pd.DataFrame()
+    for key, event in [('r0', 'rest_start'), ('r1', 'rest_end'), ('a0', 'ascent_start'), \
+                       ('a1', 'ascent_end'), ('d0', 'descent_start'), ('d1', 'descent_end')]:
+        df[key + 't'] = p[event].view('datetime64[ns]')
+        df[key + 'z'] = p[event + '_z']
     return df
 
 
@@ -77,3 +79,55 @@ colors = {
 def DataFnm(site, instrument, time, sensor): 
     datafnm = './../data/' + site + '_' + instrument + '_' + time + '_' + sensor + '.nc'
     return datafnm
+
+
+
+class SensorStore:
+    """
+    Pool of open sensor datasets keyed by (site, instrument, time, sensor) as in DataFnm() and
+    the sensors table, e.g. ('osb', 'ctd', 'jan22', 'temperature'). A dataset is opened lazily
+    (xr.open_dataset) the first time it is asked for and the same object is returned after that,
+    so a notebook session opens each data file once. Datasets are charged at their full size
+    (ds.nbytes, what they hold once their values are read); when the total exceeds budget bytes
+    the least recently used datasets are closed. The most recent one is always kept.
+        store = SensorStore(budget = 500*1024**2)
+        T = store['osb', 'ctd', 'jan22', 'temperature']
+        S = store.Open('osb', 'ctd', 'jan22', 'salinity')
+    """
+
+    def __init__(self, budget=1024**3, fnm=DataFnm):
+        self.budget   = budget
+        self.fnm      = fnm              # (site, instrument, time, sensor) -> file name
+        self.datasets = OrderedDict()    # key: (dataset, nbytes), least recently used first
+
+    def __len__(self): return len(self.datasets)
+
+    def __contains__(self, key): return tuple(key) in self.datasets
+
+    def __getitem__(self, key): return self.Open(*key)
+
+    def nbytes(self): return sum(n for ds, n in self.datasets.values())
+
+    def Open(self, site, instrument, time, sensor):
+        key = (site, instrument, time, sensor)
+        if key in self.datasets:
+            self.datasets.move_to_end(key)
+            return self.datasets[key][0]
+        ds = xr.open_dataset(self.fnm(*key))
+        self.datasets[key] = (ds, ds.nbytes)
+        self.Trim()
+        return ds
+
+    def Trim(self):
+        """Close least recently used datasets until the total is within budget"""
+        total = self.nbytes()
+        while total > self.budget and len(self.datasets) > 1:
+            key, (ds, n) = self.datasets.popitem(last=False)
+            ds.close()
+            total -= n
+
+    def Close(self, key=None):
+        """Close one dataset (key as in Open()) or, with no key, all of them"""
+        keys = list(self.datasets) if key is None else [tuple(key)]
+        for k in keys:
+            if k in self.datasets: self.datasets.pop(k)[0].close()
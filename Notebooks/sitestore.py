@@ -0,0 +1,156 @@
+##################
+#
+# Site store: all sensors of one site and time span in one chunked, compressed file
+#
+# The data folder holds one NetCDF file per sensor, e.g. osb_ctd_jan22_temperature.nc, named
+#   site_instrument_time_sensor as in shallowprofiler.DataFnm(). Each repeats its instrument's
+#   time axis and depth z. ConsolidateSensors() packs them into one NetCDF-4 (HDF5) store:
+#   one shared time axis (the union of the sensors' times), one z and one sample mask per
+#   instrument, and each sensor variable compressed on its own. Rows are laid out by day,
+#   rows_per_day rows for every day (unused rows have time NaT), and one chunk is one day;
+#   a time slice reads only the chunks of the days it covers.
+#
+##################
+
+import os, glob
+import numpy as np, pandas as pd, xarray as xr
+from numpy import datetime64 as dt64, timedelta64 as td64
+
+
+store_compression = {'zlib': True, 'complevel': 4, 'shuffle': True}     # per-variable default
+day_ns            = td64(1, 'D').astype('timedelta64[ns]').astype(np.int64)
+
+
+def StoreFnm(site, time, folder=None):
+    '''Site store file name, e.g. ../data/osb_jan22_store.nc'''
+    if folder is None: folder = os.getcwd() + '/../data'
+    return os.path.join(folder, site + '_' + time + '_store.nc')
+
+
+def SensorFiles(site, time, folder=None):
+    '''{(instrument, sensor): file name} for the per-sensor files site_instrument_time_sensor.nc'''
+    if folder is None: folder = os.getcwd() + '/../data'
+    files = {}
+    for fnm in sorted(glob.glob(os.path.join(folder, site + '_*_' + time + '_*.nc'))):
+        parts = os.path.basename(fnm)[:-3].split('_')
+        if len(parts) == 4 and parts[0] == site and parts[2] == time: files[(parts[1], parts[3])] = fnm
+    return files
+
+
+def ConsolidateSensors(site, time, folder=None, outfnm=None, compression=None):
+    '''
+    Pack every per-sensor file of site and time (e.g. 'osb', 'jan22') into one site store and
+    return its file name (default StoreFnm(site, time, folder)). For a site-year pass the year
+    label used in the file names, e.g. 'osb', '2021'.
+    Store variables are named instrument_variable: ctd_temperature, spkir_412nm, ...; each
+    instrument has instrument_z (depth) and instrument_sampled (1 where it has a sample). If two
+    files of one instrument differ in time axis or depth the second gets instrument_sensor_z and
+    instrument_sensor_sampled. compression maps store variable names to NetCDF-4 encoding that
+    replaces store_compression for that variable, e.g. {'ctd_pressure': {'zlib': True, 'complevel': 9}}.
+    '''
+    files = SensorFiles(site, time, folder)
+    if not files: raise ValueError('no sensor files for ' + site + ' ' + time)
+    if outfnm is None: outfnm = StoreFnm(site, time, folder)
+    if compression is None: compression = {}
+
+    sources = {key: xr.load_dataset(fnm) for key, fnm in files.items()}
+    tns     = {key: ds.time.values.astype('datetime64[ns]').view('int64') for key, ds in sources.items()}
+
+    # shared time axis laid out as whole days of rows_per_day rows
+    t      = np.unique(np.concatenate(list(tns.values())))
+    day0   = (t[0] // day_ns) * day_ns
+    day    = (t - day0) // day_ns
+    counts = np.bincount(day)
+    rows_per_day = int(counts.max())
+    first  = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    row    = day*rows_per_day + np.arange(len(t)) - first[day]
+    nrows  = len(counts)*rows_per_day
+    rowtime = np.full(nrows, np.iinfo(np.int64).min, dtype=np.int64)
+    rowtime[row] = t
+
+    variables, groups = {}, {}
+    for (instrument, sensor), ds in sources.items():
+        at, z = row[np.searchsorted(t, tns[(instrument, sensor)])], ds.z.values
+        group = instrument
+        if group in groups and not (np.array_equal(groups[group][0], at) and np.array_equal(groups[group][1], z)):
+            group = instrument + '_' + sensor
+        if group not in groups:
+            groups[group] = (at, z)
+            zrow, sampled = np.full(nrows, np.nan, dtype=z.dtype), np.zeros(nrows, dtype=np.int8)
+            zrow[at], sampled[at] = z, 1
+            variables[group + '_z']       = xr.Variable('row', zrow, ds.z.attrs)
+            variables[group + '_sampled'] = xr.Variable('row', sampled)
+        for v in ds.data_vars:
+            if v == 'z': continue
+            vrow = np.full(nrows, np.nan, dtype=ds[v].dtype)
+            vrow[at] = ds[v].values
+            attrs = {k: a for k, a in ds[v].attrs.items() if not k.startswith('_')}
+            attrs.update({'instrument': instrument, 'sensor': sensor, 'name': v, 'group': group})
+            variables[instrument + '_' + v] = xr.Variable('row', vrow, attrs)
+
+    store = xr.Dataset(variables, coords={'time': ('row', rowtime.view('datetime64[ns]'))},
+                       attrs={'site': site, 'span': time, 'rows_per_day': rows_per_day,
+                              'day0': str(dt64(int(day0), 'ns').astype('datetime64[D]'))})
+    encoding = {}
+    for v in store.variables:
+        encoding[v] = dict(compression.get(v, store_compression), chunksizes=(rows_per_day,))
+    encoding['time'].update({'units': 'nanoseconds since ' + store.attrs['day0'], 'dtype': 'int64'})
+
+    store.to_netcdf(outfnm + '.tmp', engine='netcdf4', format='NETCDF4', encoding=encoding)
+    os.replace(outfnm + '.tmp', outfnm)
+    return outfnm
+
+
+def OpenSiteStore(fnm):
+    '''Open a site store lazily: one metadata read for all sensors; values are read on access'''
+    return xr.open_dataset(fnm, engine='netcdf4')
+
+
+def StoreRows(store, t0=None, t1=None):
+    '''Row range (r0, r1) of the days that [t0, t1) touches; whole chunks'''
+    rpd, day0, nrows = int(store.attrs['rows_per_day']), dt64(store.attrs['day0'], 'ns'), store.sizes['row']
+    r0 = 0     if t0 is None else max(0,     int((dt64(t0, 'ns') - day0) // td64(1, 'D')) * rpd)
+    r1 = nrows if t1 is None else min(nrows, int(-((day0 - dt64(t1, 'ns')) // td64(1, 'D'))) * rpd)
+    return r0, max(r0, r1)
+
+
+def ReadSiteStore(store, t0=None, t1=None, variables=None):
+    '''
+    Time-indexed Dataset of store variables (default all) for times in [t0, t1); store is an
+    open site store or its file name. Only the chunks (days) covering [t0, t1) are read.
+    Rows where none of the chosen variables' instruments sampled are dropped.
+    '''
+    if not isinstance(store, xr.Dataset): store = OpenSiteStore(store)
+    if variables is None: variables = [v for v in store.data_vars if 'group' in store[v].attrs]
+    groups  = sorted(set(store[v].attrs['group'] for v in variables))
+    r0, r1  = StoreRows(store, t0, t1)
+    part    = store[list(variables) + [g + '_z' for g in groups] + [g + '_sampled' for g in groups]].isel(row=slice(r0, r1)).load()
+    tns     = part['time'].values.astype('datetime64[ns]').view('int64')
+    keep    = (part[groups[0] + '_sampled'].values == 1) if groups else np.zeros(len(tns), dtype=bool)
+    for g in groups[1:]: keep |= part[g + '_sampled'].values == 1
+    if t0 is not None: keep &= tns >= dt64(t0, 'ns').astype(np.int64)
+    if t1 is not None: keep &= tns <  dt64(t1, 'ns').astype(np.int64)
+    return part.isel(row=np.flatnonzero(keep)).swap_dims({'row': 'time'})
+
+
+def ReadStoreSensor(store, instrument, sensor, t0=None, t1=None):
+    '''
+    One sensor from a site store in the layout of its per-sensor file: time dimension, the
+    sensor variable(s) under their original names (e.g. 'temperature', or '412nm' ... for spkir)
+    and z; only the instrument's own samples in [t0, t1).
+    '''
+    if not isinstance(store, xr.Dataset): store = OpenSiteStore(store)
+    names = [v for v in store.data_vars if store[v].attrs.get('instrument') == instrument and store[v].attrs.get('sensor') == sensor]
+    if not names: raise KeyError(instrument + ' ' + sensor + ' is not in this store')
+    group   = store[names[0]].attrs['group']
+    r0, r1  = StoreRows(store, t0, t1)
+    part    = store[names + [group + '_z', group + '_sampled']].isel(row=slice(r0, r1)).load()
+    tns     = part['time'].values.astype('datetime64[ns]').view('int64')
+    keep    = part[group + '_sampled'].values == 1
+    if t0 is not None: keep &= tns >= dt64(t0, 'ns').astype(np.int64)
+    if t1 is not None: keep &= tns <  dt64(t1, 'ns').astype(np.int64)
+    part    = part.isel(row=np.flatnonzero(keep)).swap_dims({'row': 'time'}).drop_vars(group + '_sampled')
+    part    = part.rename({v: part[v].attrs['name'] for v in names} | {group + '_z': 'z'})
+    for v in part.data_vars:
+        for k in ('instrument', 'sensor', 'name', 'group'): part[v].attrs.pop(k, None)
+    return part
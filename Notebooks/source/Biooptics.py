@@ -17,19 +17,36 @@
 ##################
 
 import os, sys, time, glob, warnings
-from IPython.display import clear_output
+from functools import lru_cache
 warnings.filterwarnings('ignore')
 this_dir = os.getcwd()
 
-from matplotlib import pyplot as plt
-from matplotlib import colors as mplcolors
-from matplotlib import animation, rc
 import numpy as np, pandas as pd, xarray as xr
 from numpy import datetime64 as dt64, timedelta64 as td64
 
-from ipywidgets import *
-from traitlets import dlink
-from IPython.display import HTML, Video
+# The shared Notebooks modules (deferred.py, profileindex.py, profileslices.py, sensorbundle.py) live one folder up
+notebooks_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if notebooks_dir not in sys.path: sys.path.append(notebooks_dir)
+from profileindex import ClassifyProfiles, MIDNIGHT, NOON
+from profileslices import ProfileSlicesFor
+
+# Plotting and widget modules are imported when first used, so that importing this module
+#   is fast and works without a display (e.g. in batch workers); see deferred.py
+from deferred import Deferred
+from sensorbundle import SensorBundle, osb_march2021_1min, osb_junejuly2018_1min, osb_qc_agg
+
+plt          = Deferred('matplotlib.pyplot')
+mplcolors    = Deferred('matplotlib.colors')
+animation    = Deferred('matplotlib.animation')
+rc           = Deferred('matplotlib', 'rc')
+widgets      = Deferred('ipywidgets')
+interact     = Deferred('ipywidgets', 'interact')
+interactive  = Deferred('ipywidgets', 'interactive')
+fixed        = Deferred('ipywidgets', 'fixed')
+dlink        = Deferred('traitlets', 'dlink')
+clear_output = Deferred('IPython.display', 'clear_output')
+HTML         = Deferred('IPython.display', 'HTML')
+Video        = Deferred('IPython.display', 'Video')
 
 
 ##################
@@ -201,18 +218,19 @@ def ReadProfileMetadata(fnm):
 #######################
 def GenerateTimeWindowIndices(p, date0, date1, time0, time1):
     '''
-    Given two day boundaries and a time window (UTC) within a day: Return a list
+    Given two day boundaries and a time window (UTC) within a day: Return a NumPy array
     of indices of profiles that start within both the day and time bounds. This 
-    works from the passed dataframe of profile times.
+    works from the passed dataframe of profile times. Rows are in time order so the
+    day bounds are two binary searches on ascent_start; the time of day (nanoseconds
+    past midnight) is then tested as a mask over just the rows between those bounds.
     '''
-    nprofiles = len(p)
-    pIndices = []
-    for i in range(nprofiles):
-        a0 = p["ascent_start"][i]
-        if a0 >= date0 and a0 <= date1 + td64(1, 'D'):
-            delta_t = a0 - dt64(a0.date())
-            if delta_t >= time0 and delta_t <= time1: pIndices.append(i)
-    return pIndices
+    a0     = p["ascent_start"].values.astype('datetime64[ns]').view('int64')
+    day_ns = td64(1, 'D').astype('timedelta64[ns]').astype('int64')
+    i0     = np.searchsorted(a0, dt64(date0, 'ns').astype('int64'), side='left')
+    i1     = np.searchsorted(a0, dt64(date1, 'ns').astype('int64') + day_ns, side='right')
+    tod    = a0[i0:i1] % day_ns
+    inside = (tod >= td64(time0, 'ns').astype('int64')) & (tod <= td64(time1, 'ns').astype('int64'))
+    return i0 + np.flatnonzero(inside)
 
 
 def ProfileEvaluation(t0, t1, p):
@@ -224,29 +242,14 @@ def ProfileEvaluation(t0, t1, p):
     This function evaluates profiles within a given time range: How many profiles are there?
     How many 'local noon', how many 'local midnight'? This is a simple way to check profiler 
     operating consistency. This depends in turn on the profiler metadata reliability.
+    Profiles are counted by ascent start in [t0, t1). Noon and midnight are
+    profileindex.ClassifyProfiles() classes, with windows found from the long descents of
+    each year of p; see also profileindex.DailyProfileCounts().
     '''
-    global midn0, midn1, noon0, noon1
-    
-    nTotal = 0
-    nMidn = 0
-    nNoon = 0
-    nNinePerDay = 0
-
-    for i in range(len(p)):
-            
-        if p["ascent_start"][i] >= t0 and p["ascent_start"][i] <= t1:
-            nTotal += 1
-            
-            if p["descent_end"][i] - p["descent_start"][i] >= td64(60, 'm'):
-                
-                tProf = p["ascent_start"][i]
-                day_time = tProf - dt64(tProf.date())
-
-                if   day_time > midn0 and day_time < midn1: nMidn += 1
-                elif day_time > noon0 and day_time < noon1: nNoon += 1
-                else: print("found a long descent that did not fit noon or midnight...")
-        
-    return nTotal, nMidn, nNoon
+    a0      = p["ascent_start"].values.astype('datetime64[ns]')
+    inside  = (a0 >= dt64(t0, 'ns')) & (a0 < dt64(t1, 'ns'))
+    classes = ClassifyProfiles(p)[inside]
+    return int(inside.sum()), int((classes == MIDNIGHT).sum()), int((classes == NOON).sum())
 
 
 def GetDiscreteSummaryCastSubset(dsDf, cast, columns):
@@ -294,8 +297,8 @@ def ChartAB(p, xrng, pIdcs, A, Az, Albl, Acolor, B, Bz, Blbl, Bcolor, wid, hgt,
     # create a list of twin axes, one for each chart
     axstwin0 = [axs[i].twiny() for i in range(ncharts)]
 
-    keyA0, keyA1 = legA + "_start", legA + "_end"
-    keyB0, keyB1 = legB + "_start", legB + "_end"
+    keyA0  = legA + "_start"
+    slices = ProfileSlicesFor(p)
             
     # this index i will range across the dataframe indices for ascent profiles
     for i in range(ncharts):
@@ -304,11 +307,10 @@ def ChartAB(p, xrng, pIdcs, A, Az, Albl, Acolor, B, Bz, Blbl, Bcolor, wid, hgt,
         #   index 0, 1, 2, ... These are respectively pIdx and i
         pIdx = pIdcs[i]
 
-        tA0, tA1 = p[keyA0][pIdx], p[keyA1][pIdx]
-        tB0, tB1 = p[keyB0][pIdx], p[keyB1][pIdx]
+        tA0 = p[keyA0][pIdx]
         
-        Ax, Ay = A.sel(time=slice(tA0,  tA1)), Az.sel(time=slice(tA0, tA1))
-        Bx, By = B.sel(time=slice(tB0,  tB1)), Bz.sel(time=slice(tB0, tB1))
+        Ax, Ay = slices.View(pIdx, legA, A, Az)
+        Bx, By = slices.View(pIdx, legB, B, Bz)
         
         axs[i].plot(Ax, Ay, ms = 4., color=Acolor, mfc=Acolor)
         axstwin0[i].plot(Bx, By, markersize = 4., color=Bcolor, mfc=Bcolor)
@@ -338,43 +340,15 @@ def ChartAB(p, xrng, pIdcs, A, Az, Albl, Acolor, B, Bz, Blbl, Bcolor, wid, hgt,
 # Load XArray Datasets from the smaller (intra-repo!) source files
 
 def ReadOSB_March2021_1min():
+    '''All 14 March 2021 datasets, opened as they are; see SensorBundle for on-demand loading'''
     data_source = os.getcwd() + '/RepositoryData/rca/'
-    return                                                                         \
-        xr.open_dataset(data_source + 'fluor/osb_chlora_march2021_1min.nc'),       \
-        xr.open_dataset(data_source + 'fluor/osb_backscatter_march2021_1min.nc'),  \
-        xr.open_dataset(data_source + 'fluor/osb_cdom_march2021_1min.nc'),         \
-        xr.open_dataset(data_source + 'ctd/osb_temp_march2021_1min.nc'),           \
-        xr.open_dataset(data_source + 'ctd/osb_salinity_march2021_1min.nc'),       \
-        xr.open_dataset(data_source + 'ctd/osb_doxygen_march2021_1min.nc'),        \
-        xr.open_dataset(data_source + 'pH/osb_ph_march2021_1min.nc'),              \
-        xr.open_dataset(data_source + 'irrad/osb_spectir_march2021_1min.nc'),      \
-        xr.open_dataset(data_source + 'nitrate/osb_nitrate_march2021_1min.nc'),    \
-        xr.open_dataset(data_source + 'par/osb_par_march2021_1min.nc'),            \
-        xr.open_dataset(data_source + 'current/osb_veast_march2021_1min.nc'),      \
-        xr.open_dataset(data_source + 'current/osb_vnorth_march2021_1min.nc'),     \
-        xr.open_dataset(data_source + 'current/osb_vup_march2021_1min.nc'),        \
-        xr.open_dataset(data_source + 'pCO2/osb_pco2_march2021.nc')
+    return tuple(xr.open_dataset(data_source + osb_march2021_1min[k]) for k in 'ABCTSOHINPUVWR')
 
 
 def ReadOSB_JuneJuly2018_1min():
+    '''All 13 June/July 2018 datasets (no pCO2), opened as they are'''
     data_source = os.getcwd() + '/RepositoryData/rca/'
-    return                                                                         \
-        xr.open_dataset(data_source + 'fluor/osb_chlora_june_july2018_1min.nc'),       \
-        xr.open_dataset(data_source + 'fluor/osb_backscatter_june_july2018_1min.nc'),  \
-        xr.open_dataset(data_source + 'fluor/osb_cdom_june_july2018_1min.nc'),         \
-        xr.open_dataset(data_source + 'ctd/osb_temp_june_july2018_1min.nc'),           \
-        xr.open_dataset(data_source + 'ctd/osb_salinity_june_july2018_1min.nc'),       \
-        xr.open_dataset(data_source + 'ctd/osb_doxygen_june_july2018_1min.nc'),        \
-        xr.open_dataset(data_source + 'pH/osb_ph_june_july2018_1min.nc'),              \
-        xr.open_dataset(data_source + 'irrad/osb_spectir_june_july2018_1min.nc'),      \
-        xr.open_dataset(data_source + 'nitrate/osb_nitrate_june_july2018_1min.nc'),    \
-        xr.open_dataset(data_source + 'par/osb_par_june_july2018_1min.nc'),            \
-        xr.open_dataset(data_source + 'current/osb_veast_june_july2018_1min.nc'),      \
-        xr.open_dataset(data_source + 'current/osb_vnorth_june_july2018_1min.nc'),     \
-        xr.open_dataset(data_source + 'current/osb_vup_june_july2018_1min.nc')
-
-
-
+    return tuple(xr.open_dataset(data_source + osb_junejuly2018_1min[k]) for k in 'ABCTSOHINPUVW')
 
 
 def SixSignalChartSequence(df, A, B, C, O, S, T, xrng, chart_indices = [506]):
@@ -403,29 +377,30 @@ def SixSignalChartSequence(df, A, B, C, O, S, T, xrng, chart_indices = [506]):
     axstwin0 = [axs[i][0].twiny() for i in range(ncharts)]
     axstwin1 = [axs[i][1].twiny() for i in range(ncharts)]
     axstwin2 = [axs[i][2].twiny() for i in range(ncharts)]
+    slices   = ProfileSlicesFor(df)
 
     for i in range(ncharts):
 
         # chart row index is i; profile index (dataframe df is OSB, 2021) is pIdx
         pIdx = chart_indices[i]
 
-        ta0, ta1 = df["ascent_start"][pIdx], df["ascent_end"][pIdx]
+        ta0 = df["ascent_start"][pIdx]
 
-        Asel = A.sel(time=slice(ta0,  ta1))
-        Bsel = B.sel(time=slice(ta0,  ta1))
-        Csel = C.sel(time=slice(ta0,  ta1))
-        Osel = O.sel(time=slice(ta0,  ta1))
-        Ssel = S.sel(time=slice(ta0,  ta1))
-        Tsel = T.sel(time=slice(ta0,  ta1))
+        Tx, Tz = slices.View(pIdx, 'ascent', T.temp,        T.z)
+        Sx, Sz = slices.View(pIdx, 'ascent', S.salinity,    S.z)
+        Ox, Oz = slices.View(pIdx, 'ascent', O.doxygen,     O.z)
+        Ax, Az = slices.View(pIdx, 'ascent', A.chlora,      A.z)
+        Bx,    = slices.View(pIdx, 'ascent', B.backscatter)
+        Cx, Cz = slices.View(pIdx, 'ascent', C.cdom,        C.z)
 
-        axs[i][0].plot(Tsel.temp,        Tsel.z, ms = 4., color=colorT, mfc=colorT)
-        axstwin0[i].plot(Ssel.salinity,  Ssel.z, ms = 4., color=colorS, mfc=colorS)
+        axs[i][0].plot(Tx,   Tz, ms = 4., color=colorT, mfc=colorT)
+        axstwin0[i].plot(Sx, Sz, ms = 4., color=colorS, mfc=colorS)
 
-        axs[i][1].plot(Osel.doxygen,     Osel.z, ms = 4., color=colorO, mfc=colorO)
-        axstwin1[i].plot(Asel.chlora,    Asel.z, ms = 4., color=colorA, mfc=colorA)
+        axs[i][1].plot(Ox,   Oz, ms = 4., color=colorO, mfc=colorO)
+        axstwin1[i].plot(Ax, Az, ms = 4., color=colorA, mfc=colorA)
 
-        axs[i][2].plot(Bsel.backscatter, Csel.z, ms = 4., color=colorB, mfc=colorB)
-        axstwin2[i].plot(Csel.cdom,      Csel.z, ms = 4., color=colorC, mfc=colorC)
+        axs[i][2].plot(Bx,   Cz, ms = 4., color=colorB, mfc=colorB)
+        axstwin2[i].plot(Cx, Cz, ms = 4., color=colorC, mfc=colorC)
         
         # axis ranges
         if i == 0: 
@@ -470,9 +445,9 @@ def BundleStatic(p, date0, date1, time0, time1, wid, hgt, color, x0, x1, y0, y1,
     pIdcs = GenerateTimeWindowIndices(p, date0, date1, time0, time1)
     nProfiles = len(pIdcs)
     fig, ax = plt.subplots(figsize=(wid, hgt), tight_layout=True)
+    slices = ProfileSlicesFor(p)
     for i in range(nProfiles):
-        ta0, ta1 = p["ascent_start"][pIdcs[i]], p["ascent_end"][pIdcs[i]]
-        dsXx, dsXy = dsXd.sel(time=slice(ta0,  ta1)), dsXz.sel(time=slice(ta0, ta1))
+        dsXx, dsXy = slices.View(pIdcs[i], 'ascent', dsXd, dsXz)
         ax.plot(dsXx, dsXy, ms = 4., color=color, mfc=color)
         ax.set(title = title)
     ax.set(xlim = (x0, x1), ylim = (y0, y1))
@@ -482,18 +457,19 @@ def BundleStatic(p, date0, date1, time0, time1, wid, hgt, color, x0, x1, y0, y1,
 
 def ShowStaticBundles():
     '''creates six bundle charts for March 2021, Oregon Slope Base'''
+    p = OSBProfiles2021()
     BundleStatic(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), td64(0, 'h'), td64(24, 'h'), 5, 4, \
-                   colorO, do_lo, do_hi, -200, 0, O.doxygen, O.z, 'Oxygen')
+                   colorO, do_lo, do_hi, -200, 0, osb.O.doxygen, osb.O.z, 'Oxygen')
     BundleStatic(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), td64(0, 'h'), td64(24, 'h'), 5, 4, \
-                   colorT, temp_lo, temp_hi, -200, 0, T.temp, T.z, 'Temperature')
+                   colorT, temp_lo, temp_hi, -200, 0, osb.T.temp, osb.T.z, 'Temperature')
     BundleStatic(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), td64(0, 'h'), td64(24, 'h'), 5, 4, \
-                   colorS, sal_lo, sal_hi, -200, 0, S.salinity, S.z, 'Salinity')
+                   colorS, sal_lo, sal_hi, -200, 0, osb.S.salinity, osb.S.z, 'Salinity')
     BundleStatic(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), td64(0, 'h'), td64(24, 'h'), 5, 4, \
-                   colorA, chlora_lo, chlora_hi, -200, 0, A.chlora, A.z, 'Chlorophyll')
+                   colorA, chlora_lo, chlora_hi, -200, 0, osb.A.chlora, osb.A.z, 'Chlorophyll')
     BundleStatic(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), td64(0, 'h'), td64(24, 'h'), 5, 4, \
-                   colorC, cdom_lo, cdom_hi, -200, 0, C.cdom, C.z, 'Fluorescence')
+                   colorC, cdom_lo, cdom_hi, -200, 0, osb.C.cdom, osb.C.z, 'Fluorescence')
     BundleStatic(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), td64(0, 'h'), td64(24, 'h'), 5, 4, \
-                   colorB, bb_lo, bb_hi, -200, 0, B.backscatter, B.z, 'Particulate Backscatter')
+                   colorB, bb_lo, bb_hi, -200, 0, osb.B.backscatter, osb.B.z, 'Particulate Backscatter')
     return
     
 
@@ -504,19 +480,19 @@ def BundleInteract(choice, time_index, bundle_size):
     within the time range. Choose the sensor using a dropdown. Choose the first profile using the start slider.
     Choose the number of consecutive profiles to chart using the bundle slider. 
     '''
-    global p
+    p = OSBProfiles2021()
     
     # this code sets up chart configuration based on choice of sensor
-    if   choice == labelO: dsXv, dsXz, xlo, xhi, xtitle, xcolor = O.doxygen,     O.z, do_lo,      do_hi,      labelO, colorO
-    elif choice == labelT: dsXv, dsXz, xlo, xhi, xtitle, xcolor = T.temp,        T.z, temp_lo,    temp_hi,    labelT, colorT
-    elif choice == labelS: dsXv, dsXz, xlo, xhi, xtitle, xcolor = S.salinity,    S.z, sal_lo,     sal_hi,     labelS, colorS
-    elif choice == labelA: dsXv, dsXz, xlo, xhi, xtitle, xcolor = A.chlora,      A.z, chlora_lo,  chlora_hi,  labelA, colorA
-    elif choice == labelB: dsXv, dsXz, xlo, xhi, xtitle, xcolor = B.backscatter, B.z, bb_lo,      bb_hi,      labelB, colorB
-    elif choice == labelC: dsXv, dsXz, xlo, xhi, xtitle, xcolor = C.cdom,        C.z, cdom_lo,    cdom_hi,    labelC, colorC
-    elif choice == labelN: dsXv, dsXz, xlo, xhi, xtitle, xcolor = N.nitrate,     N.z, nitrate_lo, nitrate_hi, labelN, colorN
-    elif choice == labelP: dsXv, dsXz, xlo, xhi, xtitle, xcolor = P.par,         P.z, par_lo,     par_hi,     labelP, colorP
-    elif choice == labelH: dsXv, dsXz, xlo, xhi, xtitle, xcolor = H.ph,          H.z, ph_lo,      ph_hi,      labelH, colorH
-    elif choice == labelR: dsXv, dsXz, xlo, xhi, xtitle, xcolor = R.pco2,        R.z, pco2_lo,    pco2_hi,    labelR, colorR
+    if   choice == labelO: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.O.doxygen,     osb.O.z, do_lo,      do_hi,      labelO, colorO
+    elif choice == labelT: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.T.temp,        osb.T.z, temp_lo,    temp_hi,    labelT, colorT
+    elif choice == labelS: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.S.salinity,    osb.S.z, sal_lo,     sal_hi,     labelS, colorS
+    elif choice == labelA: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.A.chlora,      osb.A.z, chlora_lo,  chlora_hi,  labelA, colorA
+    elif choice == labelB: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.B.backscatter, osb.B.z, bb_lo,      bb_hi,      labelB, colorB
+    elif choice == labelC: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.C.cdom,        osb.C.z, cdom_lo,    cdom_hi,    labelC, colorC
+    elif choice == labelN: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.N.nitrate,     osb.N.z, nitrate_lo, nitrate_hi, labelN, colorN
+    elif choice == labelP: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.P.par,         osb.P.z, par_lo,     par_hi,     labelP, colorP
+    elif choice == labelH: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.H.ph,          osb.H.z, ph_lo,      ph_hi,      labelH, colorH
+    elif choice == labelR: dsXv, dsXz, xlo, xhi, xtitle, xcolor = osb.R.pco2,        osb.R.z, pco2_lo,    pco2_hi,    labelR, colorR
     else: return 0
 
     # This configuration code block is hardcoded to work with March 2021
@@ -539,13 +515,11 @@ def BundleInteract(choice, time_index, bundle_size):
     fig, ax = plt.subplots(figsize=(wid, hgt), tight_layout=True)
     iProf0 = time_index if time_index < nProfiles else nProfiles
     iProf1 = iProf0 + bundle_size if iProf0 + bundle_size < nProfiles else nProfiles
+    slices = ProfileSlicesFor(p)
+    leg    = 'descent' if choice == labelH or choice == labelR else 'ascent'
     for i in range(iProf0, iProf1):
         pIdx = pIdcs[i]
-        if choice == labelH or choice == labelR:
-            ta0, ta1 = p["descent_start"][pIdx], p["descent_end"][pIdx]
-        else:
-            ta0, ta1 = p["ascent_start"][pIdx], p["ascent_end"][pIdx]
-        dsXsensor, dsXdepth = dsXv.sel(time=slice(ta0,  ta1)), dsXz.sel(time=slice(ta0, ta1))
+        dsXsensor, dsXdepth = slices.View(pIdx, leg, dsXv, dsXz)
         ax.plot(dsXsensor, dsXdepth, ms = 4., color=color, mfc=color)
     ax.set(title = title)
     ax.set(xlim = (x0, x1), ylim = (y0, y1))
@@ -601,10 +575,10 @@ def Interactor(cu):
 
 def NitrateStaggerChart():
     '''Another visualization method: like fanning a deck of cards'''
+    p = OSBProfiles2021()
     pIdcsMidn = GenerateTimeWindowIndices(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), midn0, midn1)   # 30
     pIdcsNoon = GenerateTimeWindowIndices(p, dt64_from_doy(2021, 60), dt64_from_doy(2021, 91), noon0, noon1)   # 31
-    pIdcs = pIdcsMidn + pIdcsNoon
-    pIdcs.sort()
+    pIdcs = np.sort(np.concatenate((pIdcsMidn, pIdcsNoon)))
     nProfiles = len(pIdcs)
     print(str(nProfiles) + " profiles (noon/midnight only) in March 2021")
     profile_shift   = 50
@@ -616,7 +590,7 @@ def NitrateStaggerChart():
     fig, ax = plt.subplots(figsize=(12,7), tight_layout=True)
     for i in range(len(pIdcs)):
         ta0, ta1 = p["ascent_start"][pIdcs[i]], p["ascent_end"][pIdcs[i]]
-        Nx, Ny = N.nitrate.sel(time=slice(ta0,  ta1)), N.z.sel(time=slice(ta0, ta1))
+        Nx, Ny = osb.N.nitrate.sel(time=slice(ta0,  ta1)), osb.N.z.sel(time=slice(ta0, ta1))
         ax.plot(nitrate_stretch * Nx + i * profile_shift, Ny, ms = 4., color=colorwheel[i%cwmod] , mfc=colorwheel[i%cwmod])
     ax.set(xlim = (nitrate_lower_bound, nitrate_upper_bound), \
            ylim = (-200., 0.),                                \
@@ -631,39 +605,31 @@ def NitrateStaggerChart():
 # Load the 2021 Oregon Slope Base profile metadata; and some March 2021 sensor datasets
 ##################
 
-# Note these are profile times for Axial Base
-p = ReadProfileMetadata(os.getcwd()+"/Profiles/osb2021.csv")
-
-# Some code to test out the above ProfileEvaluation() function
-t0, t1 = dt64('2021-01-01'), dt64('2021-02-01')
-nDays = (t1 - t0).astype(int)
-nTotal, nMidn, nNoon = ProfileEvaluation(t0, t1, p)
-
-print("For 2021, month of January, we have...")
-print(nDays, 'days or', nDays*9, 'possible profiles')
-print("There were, over this time, in fact...")
-print(nTotal, 'profiles;', nMidn, 'at local midnight and', nNoon, 'at local noon')
-
-A, B, C, T, S, O, H, I, N, P, U, V, W, R = ReadOSB_March2021_1min()
-
-# Having loaded the data there are some artifacts to discard in O, T and S:
-O = O.drop('moles_of_oxygen_per_unit_mass_in_sea_water_profiler_depth_enabled_qc_agg')
-T = T.drop('sea_water_temperature_profiler_depth_enabled_qc_agg')
-S = S.drop('sea_water_practical_salinity_profiler_depth_enabled_qc_agg')
-
-# ...and then apply the .dropna() to eliminate NaNs
-
-A = A.dropna('time')
-B = B.dropna('time')
-C = C.dropna('time')
-T = T.dropna('time')
-S = S.dropna('time')
-O = O.dropna('time')
-H = H.dropna('time')
-I = I.dropna('time')
-N = N.dropna('time')
-P = P.dropna('time')
-U = U.dropna('time')
-V = V.dropna('time')
-W = W.dropna('time')
-R = R.dropna('time')
\ No newline at end of file
+# Note these are profile times for Axial Base; read on first use
+@lru_cache(maxsize=None)
+def OSBProfiles2021():
+    '''The 2021 Oregon Slope Base profile metadata (p); read on the first call, then kept'''
+    return ReadProfileMetadata(os.getcwd()+"/Profiles/osb2021.csv")
+
+
+def ProfileStatusReport(t0 = dt64('2021-01-01'), t1 = dt64('2021-02-01')):
+    '''Print the ProfileEvaluation() profile counts for [t0, t1); default January 2021'''
+    p = OSBProfiles2021()
+    nDays = (dt64(t1, 'D') - dt64(t0, 'D')).astype(int)
+    nTotal, nMidn, nNoon = ProfileEvaluation(t0, t1, p)
+
+    print("From", dt64(t0, 'D'), "up to", dt64(t1, 'D'), "we have...")
+    print(nDays, 'days or', nDays*9, 'possible profiles')
+    print("There were, over this time, in fact...")
+    print(nTotal, 'profiles;', nMidn, 'at local midnight and', nNoon, 'at local noon')
+    return nTotal, nMidn, nNoon
+
+# sensor data: osb.T, osb.S, ... are opened and cleaned on first use
+osb = SensorBundle(os.getcwd() + '/RepositoryData/rca/', osb_march2021_1min, osb_qc_agg)
+
+
+def __getattr__(name):
+    '''Biooptics.p, Biooptics.T and so on: loaded on first use'''
+    if name == 'p': return OSBProfiles2021()
+    if name in osb_march2021_1min: return getattr(osb, name)
+    raise AttributeError("module 'Biooptics' has no attribute " + repr(name))
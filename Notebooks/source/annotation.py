@@ -5,21 +5,36 @@
 ##################
 
 import os, sys, time, glob, warnings
-from IPython.display import clear_output
+from functools import lru_cache
 warnings.filterwarnings('ignore')
-this_dir = os.getcwd()  
-
-from matplotlib import pyplot as plt
-from matplotlib import colors as mplcolors
-from matplotlib import animation, rc
-from matplotlib import dates as mdates
+this_dir = os.getcwd()
 
 import numpy as np, pandas as pd, xarray as xr
 from numpy import datetime64 as dt64, timedelta64 as td64
 
-from ipywidgets import *
-from traitlets import dlink
-from IPython.display import HTML, Video
+# The shared Notebooks modules (deferred.py, profileindex.py, profileslices.py) live one folder up
+notebooks_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if notebooks_dir not in sys.path: sys.path.append(notebooks_dir)
+from profileindex import ClassifyProfiles, MIDNIGHT, NOON
+from profileslices import ProfileSlicesFor
+
+# Plotting and widget modules are imported when first used, so that importing this module
+#   is fast and works without a display (e.g. in batch workers); see deferred.py
+from deferred import Deferred
+
+plt          = Deferred('matplotlib.pyplot')
+mplcolors    = Deferred('matplotlib.colors')
+animation    = Deferred('matplotlib.animation')
+rc           = Deferred('matplotlib', 'rc')
+mdates       = Deferred('matplotlib.dates')
+widgets      = Deferred('ipywidgets')
+interact     = Deferred('ipywidgets', 'interact')
+interactive  = Deferred('ipywidgets', 'interactive')
+fixed        = Deferred('ipywidgets', 'fixed')
+dlink        = Deferred('traitlets', 'dlink')
+clear_output = Deferred('IPython.display', 'clear_output')
+HTML         = Deferred('IPython.display', 'HTML')
+Video        = Deferred('IPython.display', 'Video')
 
 
 ##################
@@ -138,24 +153,25 @@ def ProfileListFromTimeWindow(p, t1, t2):
 
 def GenerateTimeWindowIndices(p, date0, date1, time0, time1):
     '''
-    Given two day boundaries and a time window (UTC) within a day: Return a list
+    Given two day boundaries and a time window (UTC) within a day: Return a NumPy array
     of indices of profiles that start within both the day and time bounds. This 
-    works from the passed dataframe of profile times.
+    works from the passed dataframe of profile times. Rows are in time order so the
+    day bounds are two binary searches on ascent_start; the time of day (nanoseconds
+    past midnight) is then tested as a mask over just the rows between those bounds.
     '''
-    nprofiles = len(p)
-    pIndices = []
-    for i in range(nprofiles):
-        a0 = p["ascent_start"][i]
-        if a0 >= date0 and a0 <= date1 + td64(1, 'D'):
-            delta_t = a0 - dt64(a0.date())
-            if delta_t >= time0 and delta_t <= time1: pIndices.append(i)
-    return pIndices
+    a0     = p["ascent_start"].values.astype('datetime64[ns]').view('int64')
+    day_ns = td64(1, 'D').astype('timedelta64[ns]').astype('int64')
+    i0     = np.searchsorted(a0, dt64(date0, 'ns').astype('int64'), side='left')
+    i1     = np.searchsorted(a0, dt64(date1, 'ns').astype('int64') + day_ns, side='right')
+    tod    = a0[i0:i1] % day_ns
+    inside = (tod >= td64(time0, 'ns').astype('int64')) & (tod <= td64(time1, 'ns').astype('int64'))
+    return i0 + np.flatnonzero(inside)
 
 
 def ProfileEvaluation(t0, t1, p):
     '''
-    Give this function a time range t0 - t1 and the profile metadata structure; it will
-    return how many profiles fall within that time window as well as how many are local
+    Give this function a time range [t0, t1) and the profile metadata structure; it will
+    return how many profiles start within that time window as well as how many are local
     midnight and local noon 'special' profiles.
     
     Additional: At this time the profile metadata in p is broken up by year of interest and site.
@@ -165,29 +181,13 @@ def ProfileEvaluation(t0, t1, p):
     This function evaluates profiles within a given time range: How many profiles are there?
     How many 'local noon', how many 'local midnight'? This is a simple way to check profiler 
     operating consistency. This depends in turn on the profiler metadata reliability.
+    Noon and midnight are profileindex.ClassifyProfiles() classes, with windows found from
+    the long descents of each year of p; see also profileindex.DailyProfileCounts().
     '''
-    global midn0, midn1, noon0, noon1
-    
-    nTotal = 0
-    nMidn = 0
-    nNoon = 0
-    nNinePerDay = 0
-
-    for i in range(len(p)):
-            
-        if p["ascent_start"][i] >= t0 and p["ascent_start"][i] <= t1:
-            nTotal += 1
-            
-            if p["descent_end"][i] - p["descent_start"][i] >= td64(60, 'm'):
-                
-                tProf = p["ascent_start"][i]
-                day_time = tProf - dt64(tProf.date())
-
-                if   day_time > midn0 and day_time < midn1: nMidn += 1
-                elif day_time > noon0 and day_time < noon1: nNoon += 1
-                else: print("found a long descent that did not fit noon or midnight...")
-        
-    return nTotal, nMidn, nNoon
+    a0      = p["ascent_start"].values.astype('datetime64[ns]')
+    inside  = (a0 >= dt64(t0, 'ns')) & (a0 < dt64(t1, 'ns'))
+    classes = ClassifyProfiles(p)[inside]
+    return int(inside.sum()), int((classes == MIDNIGHT).sum()), int((classes == NOON).sum())
 
 
 def GetDiscreteSummaryCastSubset(dsDf, cast, columns):
@@ -223,8 +223,8 @@ def ChartAB(p, xrng, pIdcs, A, Az, Albl, Acolor, B, Bz, Blbl, Bcolor, wid, hgt,
     # create a list of twin axes, one for each chart
     axstwin0 = [axs[i].twiny() for i in range(ncharts)]
 
-    keyA0, keyA1 = legA + "_start", legA + "_end"
-    keyB0, keyB1 = legB + "_start", legB + "_end"
+    keyA0  = legA + "_start"
+    slices = ProfileSlicesFor(p)
             
     # this index i will range across the dataframe indices for ascent profiles
     for i in range(ncharts):
@@ -233,11 +233,10 @@ def ChartAB(p, xrng, pIdcs, A, Az, Albl, Acolor, B, Bz, Blbl, Bcolor, wid, hgt,
         #   index 0, 1, 2, ... These are respectively pIdx and i
         pIdx = pIdcs[i]
 
-        tA0, tA1 = p[keyA0][pIdx], p[keyA1][pIdx]
-        tB0, tB1 = p[keyB0][pIdx], p[keyB1][pIdx]
+        tA0 = p[keyA0][pIdx]
         
-        Ax, Ay = A.sel(time=slice(tA0,  tA1)), Az.sel(time=slice(tA0, tA1))
-        Bx, By = B.sel(time=slice(tB0,  tB1)), Bz.sel(time=slice(tB0, tB1))
+        Ax, Ay = slices.View(pIdx, legA, A, Az)
+        Bx, By = slices.View(pIdx, legB, B, Bz)
         
         axs[i].plot(Ax, Ay, ms = 4., color=Acolor, mfc=Acolor)
         axstwin0[i].plot(Bx, By, markersize = 4., color=Bcolor, mfc=Bcolor)
@@ -283,19 +282,31 @@ def CheckHITL(f, t1, t2):
 # Load the 2021 Oregon Slope Base profile metadata; and some March 2021 sensor datasets
 ##################
 
-# Note these are profile times for Axial Base
-p = ReadProfileMetadata(os.getcwd()+"/../Profiles/osb2021.csv")
+# Note these are profile times for Axial Base; read on first use
+@lru_cache(maxsize=None)
+def OSBProfiles2021():
+    '''The 2021 Oregon Slope Base profile metadata (p); read on the first call, then kept'''
+    return ReadProfileMetadata(os.getcwd()+"/../Profiles/osb2021.csv")
+
 
-# Some code to test out the above ProfileEvaluation() function
-t0, t1 = dt64('2021-03-01'), dt64('2021-04-01')
-nDays = (t1 - t0).astype(int)
-nTotal, nMidn, nNoon = ProfileEvaluation(t0, t1, p)
+def __getattr__(name):
+    '''annotation.p: loaded on first use'''
+    if name == 'p': return OSBProfiles2021()
+    raise AttributeError("module 'annotation' has no attribute " + repr(name))
 
-print("OOI RCA Oregon Slope Base: Shallow Profiler status report")
-print("=========================================================")
-print("For March 2021:")
-print(nDays, 'days, translates to', nDays*9, 'possible profiles')
-print("Actual:")
-print(nTotal, 'profiles;', nMidn, 'at local midnight and', nNoon, 'at local noon')
+
+def ProfileStatusReport(t0 = dt64('2021-03-01'), t1 = dt64('2021-04-01')):
+    '''Print the ProfileEvaluation() profile counts for [t0, t1); default March 2021'''
+    p = OSBProfiles2021()
+    nDays = (dt64(t1, 'D') - dt64(t0, 'D')).astype(int)
+    nTotal, nMidn, nNoon = ProfileEvaluation(t0, t1, p)
+
+    print("OOI RCA Oregon Slope Base: Shallow Profiler status report")
+    print("=========================================================")
+    print("From " + str(dt64(t0, 'D')) + " up to " + str(dt64(t1, 'D')) + ":")
+    print(nDays, 'days, translates to', nDays*9, 'possible profiles')
+    print("Actual:")
+    print(nTotal, 'profiles;', nMidn, 'at local midnight and', nNoon, 'at local noon')
+    return nTotal, nMidn, nNoon
 
 
@@ -0,0 +1,4 @@
+import os, sys
+
+# the notebook modules are flat files in Notebooks/, imported by name as in the notebooks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
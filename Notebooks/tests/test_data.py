@@ -0,0 +1,38 @@
+import numpy as np, xarray as xr
+
+from data import SortUnique, WriteChunked, ReformatJob
+
+
+def test_sort_unique_orders_dedups_and_streams(tmp_path):
+    # shuffled 1-minute samples with repeated times, and a second (wavelength) dimension
+    time   = np.datetime64('2022-01-01', 'ns') + np.arange(100) * np.timedelta64(1, 'm')
+    rng    = np.random.default_rng(0)
+    order  = np.concatenate((rng.permutation(100), [5, 17, 17, 60]))
+    values = np.arange(100*3, dtype=np.float64).reshape(100, 3)
+    ds = xr.Dataset({'optical_absorption': (('time', 'wavelength'), values[order]),
+                     'z':                  ('time', -np.arange(100.)[order])},
+                    coords={'time': time[order], 'wavelength': [412., 440., 488.]})
+    ds.to_netcdf(tmp_path / 'shuffled.nc')
+
+    with xr.open_dataset(tmp_path / 'shuffled.nc') as raw:
+        out, nduplicates = SortUnique(raw, 'time', time[10], time[89])
+        assert not out['optical_absorption'].variable._in_memory
+        WriteChunked(out, str(tmp_path / 'sorted.nc'), chunk=7)
+    assert nduplicates == 3
+
+    result   = xr.load_dataset(tmp_path / 'sorted.nc')
+    expected = xr.Dataset({'optical_absorption': (('time', 'wavelength'), values[10:90]), 'z': ('time', -np.arange(10., 90.))},
+                          coords={'time': time[10:90], 'wavelength': [412., 440., 488.]})
+    assert result.identical(expected)
+
+
+def test_reformat_job_counts_rows_along_swapped_dimension(tmp_path):
+    # 'obs' is swapped for time; the longer wavelength dimension must not be taken as the row count
+    time = np.datetime64('2022-01-01', 'ns') + np.array([0, 1, 1, 2]) * np.timedelta64(1, 'm')
+    ds   = xr.Dataset({'time': ('obs', time), 'spectra': (('obs', 'wavelength'), np.zeros((4, 10)))},
+                      coords={'wavelength': np.arange(10.)})
+    ds.to_netcdf(tmp_path / 'raw.nc')
+
+    report = ReformatJob(str(tmp_path / 'raw.nc'), str(tmp_path / 'out' / 'raw.nc'), {'swap': {'obs': 'time'}})
+    assert report['error'] == ''
+    assert (report['rows_in'], report['rows_out'], report['duplicates']) == (4, 3, 1)
@@ -0,0 +1,71 @@
+import os
+import numpy as np, pandas as pd
+
+import profilecatalog
+from profilecatalog import ProfileCatalog, ParseProfileFile, ReadProfileTimes, CacheFnm, profile_time_columns
+
+
+def WriteProfileCSV(fnm, ascent_starts):
+    '''a profile CSV in the (index, time) pairs layout: ascent 60, descent 30, rest 20 minutes'''
+    minute = np.timedelta64(1, 'm')
+    rows   = [',' + ','.join(str(i) for i in range(12))]
+    for k, a0 in enumerate(np.array(ascent_starts, dtype='datetime64[m]')):
+        events = [a0, a0 + 60*minute, a0 + 60*minute, a0 + 90*minute, a0 + 90*minute, a0 + 110*minute]
+        rows.append(str(k) + ',' + ','.join('0,' + str(t).replace('T', ' ') + ':00' for t in events))
+    fnm.write_text('\n'.join(rows) + '\n')
+
+
+def test_multi_year_parts_are_views(tmp_path):
+    WriteProfileCSV(tmp_path / 'osb2020.csv', ['2020-06-01T00:00', '2020-12-31T23:00', '2021-01-01T02:00'])
+    WriteProfileCSV(tmp_path / 'osb2021.csv', ['2021-01-01T02:00', '2021-01-01T05:00', '2021-06-01T00:00'])
+    catalog = ProfileCatalog(str(tmp_path))
+
+    parts = catalog.Parts('osb', '2020-12-01', '2021-02-01')
+    assert [len(q['ascent_start']) for q in parts] == [2, 1]         # the New Year profile is kept once
+    for q, fnm in zip(parts, ('osb2020.csv', 'osb2021.csv')):
+        assert all(np.shares_memory(q[k], catalog.loaded[str(tmp_path / fnm)][k]) for k in profile_time_columns)
+
+    times = catalog.Times('osb', '2020-12-01', '2021-02-01')
+    assert list(times['ascent_start'].view('datetime64[ns]')) == \
+           [np.datetime64(t, 'ns') for t in ('2020-12-31T23:00', '2021-01-01T02:00', '2021-01-01T05:00')]
+    assert len(catalog.Index('osb')) == 5
+
+
+def test_sidecar_round_trip_and_invalidation(tmp_path, monkeypatch):
+    fnm = tmp_path / 'osb2020.csv'
+    WriteProfileCSV(fnm, ['2020-06-01T00:00', '2020-06-01T03:00'])
+    parsed = ParseProfileFile(str(fnm))
+
+    first = ReadProfileTimes(str(fnm))
+    assert os.path.exists(CacheFnm(str(fnm)))
+    with monkeypatch.context() as m:
+        m.setattr(profilecatalog, 'ParseProfileFile', None)           # the second read must not parse
+        cached = ReadProfileTimes(str(fnm))
+    assert sorted(cached) == sorted(parsed) and all(np.array_equal(cached[k], parsed[k]) for k in parsed)
+    assert all(np.array_equal(first[k], parsed[k]) for k in parsed)
+
+    # a changed CSV (new size and modification time) is parsed again
+    WriteProfileCSV(fnm, ['2020-06-01T00:00', '2020-06-01T03:00', '2020-06-01T06:00'])
+    assert len(ReadProfileTimes(str(fnm))['ascent_start']) == 3
+
+
+def test_parse_both_layouts_against_pandas(tmp_path):
+    # (index, time, depth) triples, Windows line ends and one missing rest end time
+    rows = [',' + ','.join(str(i) for i in range(18)),
+            '0,0,2022-01-01 00:00:00,-191.0,22,2022-01-01 00:22:00,-191.0,22,2022-01-01 00:22:00,-191.0,'
+            '92,2022-01-01 01:32:00,-19.0,92,2022-01-01 01:32:00,-19.0,131,2022-01-01 02:11:00,-194.0',
+            '1,131,2022-01-01 02:11:00,-194.0,,,,157,2022-01-01 02:37:00,-194.0,'
+            '195,2022-01-01 03:15:00,-105.0,195,2022-01-01 03:15:00,-105.0,218,2022-01-01 03:38:00,-196.0']
+    (tmp_path / 'osb_profiles_jan22.csv').write_bytes(('\r\n'.join(rows) + '\r\n').encode())
+    WriteProfileCSV(tmp_path / 'osb2020.csv', ['2020-06-01T00:00', '2020-12-31T23:59'])
+
+    for name, time_fields in (('osb_profiles_jan22.csv', {'rest_start': 2, 'rest_end': 5, 'ascent_start': 8}),
+                              ('osb2020.csv',            {'ascent_start': 2, 'descent_end': 8, 'rest_end': 12})):
+        times = ParseProfileFile(str(tmp_path / name))
+        df    = pd.read_csv(tmp_path / name)
+        for k, field in time_fields.items():
+            expected = pd.to_datetime(df[str(field - 1)]).values.astype('datetime64[ns]').view('int64')
+            assert np.array_equal(times[k], expected)
+    assert 'ascent_start_z' not in ParseProfileFile(str(tmp_path / 'osb2020.csv'))
+    z = ParseProfileFile(str(tmp_path / 'osb_profiles_jan22.csv'))['rest_end_z']
+    assert z[0] == np.float32(-191.) and np.isnan(z[1])
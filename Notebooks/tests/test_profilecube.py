@@ -0,0 +1,39 @@
+import os
+import numpy as np, xarray as xr
+import pytest
+
+from profileindex import ProfileIndex
+from profilecube import ProfileCube, ArchiveMonthBlock, CubeFnm, ReadCube, TailFnm
+
+
+here     = os.path.dirname(os.path.abspath(__file__))
+data_fnm = os.path.join(here, '../../data/osb_ctd_jan22_temperature.nc')
+prof_fnm = os.path.join(here, '../../profiles/osb_profiles_jan22.csv')
+
+
+@pytest.mark.skipif(not os.path.exists(data_fnm), reason='jan22 sample data not present')
+def test_archive_split_mid_leg_matches_one_pass(tmp_path):
+    p  = ProfileIndex.FromCSV(prof_fnm)
+    ds = xr.load_dataset(data_fnm)
+
+    # cut the month in the middle of profile 140's ascent
+    a0, a1 = p.Window(140, 'ascent')
+    cut    = a0 + (a1 - a0)//2
+    data   = tmp_path / 'data'
+    data.mkdir()
+    ds.sel(time=ds.time < cut).to_netcdf(data / 'osb_ctd_jan22a_temperature.nc')
+    ds.sel(time=ds.time >= cut).to_netcdf(data / 'osb_ctd_jan22b_temperature.nc')
+
+    first = ArchiveMonthBlock('osb', 'jan22a', p, data_folder=str(data), archive_folder=str(tmp_path / 'cubes'))
+    afnm  = CubeFnm('osb', 'ctd', 'temperature', 'ascent', str(tmp_path / 'cubes'))
+    assert os.path.exists(TailFnm(afnm))
+    assert 140 not in ReadCube(afnm)['profile_row'].values
+    ArchiveMonthBlock('osb', 'jan22b', p, data_folder=str(data), archive_folder=str(tmp_path / 'cubes'))
+    assert not os.path.exists(TailFnm(afnm))
+
+    archive = ReadCube(afnm)
+    full    = ProfileCube(ds.temperature, ds.z, p)
+    rows    = np.flatnonzero(full['count'].values.sum(axis=1) > 0)
+    assert np.array_equal(archive['profile_row'].values, rows)
+    assert np.array_equal(archive['count'].values, full['count'].values[rows])
+    assert np.array_equal(archive['temperature'].values, full['temperature'].values[rows], equal_nan=True)
@@ -0,0 +1,85 @@
+import os
+import numpy as np, pandas as pd, xarray as xr
+import pytest
+
+from profileindex import ProfileIndex, AttachProfileCoordinates, OpenProfileChunked, ProfileReduce, \
+                         ClassifyProfiles, DailyProfileCounts, LongDescentWindows, midnight_window, noon_window, \
+                         MIDNIGHT, NOON, IRREGULAR, NOPHASE, REST, ASCENT, DESCENT
+from profilecatalog import ProfileCatalog, ReadProfileMetadataCached
+
+
+here     = os.path.dirname(os.path.abspath(__file__))
+profiles = os.path.join(here, '../../profiles')
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(profiles, 'pre_2022_profiles/axb2019.csv')), reason='axb profiles not present')
+def test_axial_base_noon_and_midnight():
+    # axb long descents start near 7:40 and 21:00 UTC, outside the Oregon Slope Base windows
+    catalog = ProfileCatalog(profiles)
+    p       = catalog.Index('axb', '2019', '2020')
+    (m0, m1), (n0, n1) = LongDescentWindows(p)
+    assert m0 < np.timedelta64(7*60 + 40, 'm') < m1
+    assert n0 < np.timedelta64(21*60, 'm') < n1
+
+    classes = ClassifyProfiles(p)
+    assert (classes == MIDNIGHT).sum() > 150 and (classes == NOON).sum() > 150
+    assert (classes == IRREGULAR).sum() == 0
+
+    status = catalog.OperatingStatus('2021-03-01', '2021-03-04', sites=['axb'])
+    assert (status['midnight'] == 1).all() and (status['noon'] == 1).all() and (status['irregular'] == 0).all()
+
+
+def test_oregon_slope_base_matches_fixed_windows():
+    p = ReadProfileMetadataCached(os.path.join(profiles, 'osb2021.csv'))
+    derived = DailyProfileCounts(p, '2021-03-01', '2021-04-01')
+    fixed   = DailyProfileCounts(p, '2021-03-01', '2021-04-01', (midnight_window, noon_window))
+    assert derived.equals(fixed)
+    assert list(derived.sum()) == [262, 203, 29, 30, 0]
+
+
+def SyntheticProfiles(nprofiles=6, t0='2021-03-01'):
+    '''hourly profiles: rest 0-10, ascent 10-40, descent 40-55 minutes past the hour'''
+    start = np.datetime64(t0, 'ns') + np.arange(nprofiles) * np.timedelta64(1, 'h')
+    m     = lambda k: start + np.timedelta64(k, 'm')
+    return ProfileIndex(m(10), m(40), m(40), m(55), m(0), m(10))
+
+
+def test_profile_reduce_matches_per_profile_sel(tmp_path):
+    pytest.importorskip('dask')
+    p    = SyntheticProfiles()
+    time = np.datetime64('2021-03-01', 'ns') + np.arange(-30, 6*60) * np.timedelta64(1, 'm')
+    ds   = xr.Dataset({'temperature': ('time', np.sin(np.arange(len(time)) / 7.))}, coords={'time': time})
+    ds.to_netcdf(tmp_path / 'synthetic.nc')
+
+    reduced = ProfileReduce(OpenProfileChunked(str(tmp_path / 'synthetic.nc'), p), np.nanmean, 'temperature')
+    assert list(reduced.profile_id.values) == [-1] + list(range(len(p)))
+    for k in range(len(p)):
+        r0, _ = p.Window(k, 'rest')
+        r1    = r0 + np.timedelta64(1, 'h') - np.timedelta64(1, 'ns')
+        expected = float(ds.temperature.sel(time=slice(r0, r1)).mean())
+        assert np.isclose(float(reduced.values[k + 1]), expected)
+
+
+def test_locate_half_open_phases():
+    p     = SyntheticProfiles(nprofiles=2)
+    t     = np.datetime64('2021-03-01', 'ns') + np.array([-1, 0, 9, 10, 39, 40, 54, 55, 59, 60, 70]) * np.timedelta64(1, 'm')
+    pid, phase = p.Locate(t)
+    assert list(pid)   == [-1, 0, 0, 0, 0, 0, 0, -1, -1, 1, 1]
+    assert list(phase) == [NOPHASE, REST, REST, ASCENT, ASCENT, DESCENT, DESCENT, NOPHASE, NOPHASE, REST, ASCENT]
+    assert np.array_equal(p.Locate(t.astype('datetime64[s]'))[0], pid)
+    assert np.array_equal(p.Locate(t.view('int64'))[0], pid)
+
+
+def test_attach_profile_coordinates_from_dataframe():
+    p    = SyntheticProfiles(nprofiles=2)
+    df   = pd.DataFrame({k: getattr(p, k).view('datetime64[ns]') for k in 
+                         ('ascent_start', 'ascent_end', 'descent_start', 'descent_end', 'rest_start', 'rest_end')})
+    time = np.datetime64('2021-03-01', 'ns') + np.arange(-5, 125) * np.timedelta64(1, 'm')
+    ds   = xr.Dataset({'z': ('time', np.zeros(len(time)))}, coords={'time': time})
+
+    dsp  = AttachProfileCoordinates(ds, df)
+    assert dsp.profile_id.dims == ('time',) and dsp.phase.dtype == np.int8
+    for k in range(2):
+        a0, a1 = p.Window(k, 'ascent')
+        ascent = dsp.time[(dsp.profile_id == k) & (dsp.phase == ASCENT)].values
+        assert ascent[0] == a0 and ascent[-1] == a1 - np.timedelta64(1, 'm') and len(ascent) == 30
@@ -0,0 +1,23 @@
+import numpy as np, pandas as pd, xarray as xr
+
+from profileslices import ProfileSlicesFor
+
+
+def test_views_match_sel():
+    # two hourly profiles: rest 0-10, ascent 10-40, descent 40-55 minutes past the hour
+    start = np.datetime64('2021-03-01', 'ns') + np.arange(2) * np.timedelta64(1, 'h')
+    m     = lambda k: start + np.timedelta64(k, 'm')
+    p     = pd.DataFrame({'rest_start': m(0), 'rest_end': m(10), 'ascent_start': m(10), 'ascent_end': m(40),
+                          'descent_start': m(40), 'descent_end': m(55)})
+    time  = np.datetime64('2021-03-01', 'ns') + np.arange(130) * np.timedelta64(1, 'm')
+    ds    = xr.Dataset({'chlora': ('time', np.arange(130.)), 'z': ('time', -np.arange(130.))}, coords={'time': time})
+
+    slices = ProfileSlicesFor(p)
+    assert ProfileSlicesFor(p) is slices
+    for k in range(len(p)):
+        for leg in ('rest', 'ascent', 'descent'):
+            window = slice(p[leg + '_start'][k], p[leg + '_end'][k])
+            x, z   = slices.View(k, leg, ds.chlora, ds.z)
+            assert np.array_equal(x, ds.chlora.sel(time=window).values)
+            assert np.array_equal(z, ds.z.sel(time=window).values)
+    assert len(slices.tables) == 1
@@ -0,0 +1,46 @@
+import os, sys
+import numpy as np, pandas as pd, xarray as xr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../deprecated'))
+from rcaprofiler import PrintProfileStatistics, AssembleProfiles, ProfileSiteYear
+
+
+def test_print_profile_statistics_unequal_lengths(capsys):
+    # three profiles of 30 min ascent, 40 min descent, 20 min rest; rest ends are a0[1:], one short
+    t0 = np.datetime64('2022-01-01T00:00')
+    m  = lambda k: t0 + np.timedelta64(k, 'm')
+    a0 = [(i, m(90*i))      for i in range(3)]
+    a1 = [(i, m(90*i + 30)) for i in range(3)]
+    d1 = [(i, m(90*i + 70)) for i in range(3)]
+    r0 = list(d1)
+    r1 = [(i, m(90*i + 90)) for i in range(2)]
+    PrintProfileStatistics(a0, a1, a1, d1, r0, r1)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split()[1:] == ['30.0', '0.0']
+    assert lines[2].split()[1:] == ['40.0', '0.0']
+    assert lines[3].split()[1:] == ['20.0', '0.0']
+
+
+def test_profile_site_year_on_synthetic_pressure(tmp_path):
+    # twelve 130 minute profiles: rest 30 min at 190 dbar, ascent 60 min to 10 dbar, descent 40 min
+    one = np.concatenate((np.full(30, 190.), np.linspace(190, 10, 61)[:-1], np.linspace(10, 190, 41)[:-1]))
+    s   = np.concatenate((np.tile(one, 12), np.full(30, 190.)))
+    t   = np.datetime64('2021-03-01', 'ns') + np.arange(len(s)) * np.timedelta64(1, 'm')
+    xr.Dataset({'sea_water_pressure_profiler_depth_enabled': ('time', s)}, coords={'time': t}).to_netcdf(tmp_path / 'p.nc')
+
+    result = ProfileSiteYear(str(tmp_path / 'p.nc'), 'osb', 2021, outdir=str(tmp_path), verbose=False)
+    assert (result['n_profiles'], result['n_time_slips'], result['consistent']) == (11, 0, True)
+    df = pd.read_csv(result['csv'])
+    assert list(df['0']) == [30 + 130*k for k in range(11)]                              # ascent starts
+    assert list(df['10']) == list(df['0'][1:]) + [30 + 130*11]                           # rest end = next ascent
+
+
+def test_assemble_profiles_removes_time_slips():
+    # profile 1 starts inside profile 0 (a second ascent start detected for one ascent)
+    t        = np.arange(100, dtype=np.int64)
+    ascents  = (np.array([0, 5, 30]),   np.array([10, 12, 40]))
+    descents = (np.array([10, 12, 40]), np.array([20, 22, 50]))
+    rests    = (np.array([20, 22, 50]), np.array([30, 32, 60]))
+    profiles, nslips = AssembleProfiles(ascents, descents, rests, t)
+    assert nslips == 1
+    assert profiles.tolist() == [[0, 10, 10, 20, 20, 30], [30, 40, 40, 50, 50, 60]]
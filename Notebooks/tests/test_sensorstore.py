@@ -0,0 +1,24 @@
+import numpy as np, xarray as xr
+import pytest
+
+pytest.importorskip('matplotlib')                 # shallowprofiler imports pyplot at the top
+from shallowprofiler import SensorStore
+
+
+def test_least_recently_used_dataset_is_closed(tmp_path):
+    fnm = lambda site, instrument, time, sensor: str(tmp_path / (site + '_' + instrument + '_' + time + '_' + sensor + '.nc'))
+    for sensor in ('temperature', 'salinity', 'density'):
+        xr.Dataset({sensor: ('time', np.zeros(1000))}).to_netcdf(fnm('osb', 'ctd', 'jan22', sensor))
+
+    store = SensorStore(budget=2*8000, fnm=fnm)                    # room for two 8000 byte datasets
+    T = store['osb', 'ctd', 'jan22', 'temperature']
+    S = store['osb', 'ctd', 'jan22', 'salinity']
+    assert store['osb', 'ctd', 'jan22', 'temperature'] is T       # reused, and now most recent
+    store.Open('osb', 'ctd', 'jan22', 'density')
+    assert len(store) == 2 and store.nbytes() == 2*8000
+    assert ('osb', 'ctd', 'jan22', 'salinity') not in store
+    assert ('osb', 'ctd', 'jan22', 'temperature') in store
+    assert store['osb', 'ctd', 'jan22', 'salinity'] is not S        # reopened after eviction
+
+    store.Close()
+    assert len(store) == 0
@@ -0,0 +1,31 @@
+import numpy as np, xarray as xr
+
+from sitestore import ConsolidateSensors, ReadStoreSensor, ReadSiteStore
+
+
+def SensorFile(folder, instrument, sensor, time, variables):
+    '''a per-sensor file as in shallowprofiler.DataFnm(), with depth z'''
+    ds = xr.Dataset({v: ('time', x) for v, x in variables.items()}, coords={'time': time})
+    ds['z'] = ('time', -np.linspace(190., 10., len(time)))
+    ds.to_netcdf(folder / ('osb_' + instrument + '_jan22_' + sensor + '.nc'))
+    return ds
+
+
+def test_consolidate_and_read_back(tmp_path):
+    rng    = np.random.default_rng(1)
+    minute = np.datetime64('2022-01-01T22:00', 'ns') + np.arange(4*60) * np.timedelta64(1, 'm')      # crosses midnight
+    every2 = minute[::2] + np.timedelta64(30, 's')
+    files  = {('ctd', 'temperature'): SensorFile(tmp_path, 'ctd', 'temperature', minute, {'temperature': rng.normal(8, 1, len(minute))}),
+              ('ctd', 'salinity'):    SensorFile(tmp_path, 'ctd', 'salinity', minute, {'salinity': rng.normal(33, 1, len(minute))}),
+              ('do', 'do'):           SensorFile(tmp_path, 'do', 'do', every2, {'do': rng.normal(200, 10, len(every2))}),
+              ('spkir', 'spkir'):     SensorFile(tmp_path, 'spkir', 'spkir', every2, {'412nm': rng.random(len(every2)), '443nm': rng.random(len(every2))})}
+
+    store = ConsolidateSensors('osb', 'jan22', folder=str(tmp_path))
+    for (instrument, sensor), ds in files.items():
+        assert ReadStoreSensor(store, instrument, sensor).equals(ds)
+        t0, t1 = np.datetime64('2022-01-01T23:15'), np.datetime64('2022-01-02T00:45')
+        window = ds.sel(time=(ds.time >= t0) & (ds.time < t1))
+        assert ReadStoreSensor(store, instrument, sensor, t0, t1).equals(window)
+
+    both = ReadSiteStore(store, variables=['ctd_temperature', 'do_do'])
+    assert both.sizes['time'] == len(minute) + len(every2)
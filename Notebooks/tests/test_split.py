@@ -0,0 +1,30 @@
+import os
+import numpy as np, xarray as xr
+
+from OceanDataManagementModule import SplitSources, MonthEdges, split_sources
+
+
+def test_split_into_half_open_month_windows(tmp_path):
+    # samples every 6 hours from mid February into April, out of order, with samples on Mar 1 and Apr 1 00:00
+    time = np.datetime64('2021-02-15', 'ns') + np.arange(4*50) * np.timedelta64(6, 'h')
+    time = np.random.default_rng(2).permutation(time)
+    for key in ('T', 'S'):
+        fnm, renames = split_sources[key][:2]
+        source = tmp_path / 'source' / fnm.format(site='osb')
+        os.makedirs(source.parent, exist_ok=True)
+        xr.Dataset({list(renames)[0]: ('time', time.view('int64').astype(float)), 'z': ('time', np.zeros(len(time)))},
+                   coords={'time': time}).to_netcdf(source)
+
+    edges  = MonthEdges('2021-02', '2021-04')                            # Feb 1, Mar 1, Apr 1
+    report = SplitSources('osb', edges, str(tmp_path / 'out') + '/', data_source=str(tmp_path / 'source') + '/', 
+                          keys=['T', 'S'], processes=2)
+    assert len(report) == 4 and report['output'].str.endswith(('_february2021_1min.nc', '_march2021_1min.nc')).all()
+
+    for key, fnm, rows in report.itertuples(index=False):
+        out      = xr.load_dataset(fnm)
+        start    = np.datetime64('2021-02-01') if 'february' in fnm else np.datetime64('2021-03-01')
+        end      = np.datetime64('2021-03-01') if 'february' in fnm else np.datetime64('2021-04-01')
+        expected = np.sort(time[(time >= start) & (time < end)])
+        assert rows == len(expected) and np.array_equal(out.time.values, expected)
+        name = list(split_sources[key][1].values())[0]                     # renamed, e.g. temp
+        assert np.array_equal(out[name].values, expected.view('int64').astype(float))